@@ -0,0 +1,147 @@
+"""Local stand-in for the Karotz cgi-bin API.
+
+The real rabbit runs lighttpd CGI scripts on a slow ARM board: every request
+forks a shell script and, in practice, only one script runs at a time. This
+server reproduces that with a configurable latency, jitter and a single worker
+lock, and counts what the integration actually sends.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+import json
+import random
+from typing import Any
+
+from aiohttp import web
+
+# Statut typique renvoyé par /cgi-bin/status (firmware FreeRabbit)
+DEFAULT_STATUS: dict[str, Any] = {
+    "version": "200",
+    "ears_disabled": "0",
+    "sleep": "0",
+    "sleep_time": "0",
+    "led_color": "00FF00",
+    "led_pulse": "0",
+    "tts_cache_size": "12",
+    "usb_free_space": "-1",
+    "karotz_free_space": "149.5M",
+    "eth_mac": "00:00:00:00:00:00",
+    "wlan_mac": "00:0A:0B:0C:0D:0E",
+    "nb_tags": "3",
+    "nb_moods": "305",
+    "nb_sounds": "14",
+    "nb_stories": "0",
+    "karotz_percent_used_space": "37",
+    "volume": "10",
+}
+
+# Faux JPEG (SOI ... EOI) de la taille d'une capture VGA compressée
+FAKE_JPEG = b"\xff\xd8\xff\xe0" + random.Random(0).randbytes(24_000) + b"\xff\xd9"
+
+
+class FakeKarotz:
+    """A fake Karotz serving /cgi-bin/* on a loopback port."""
+
+    def __init__(
+        self,
+        latency: float = 0.15,
+        jitter: float = 0.05,
+        serialize: bool = True,
+        snapshot_latency: float = 0.8,
+        playback_duration: float = 3.0,
+    ) -> None:
+        """Initialize the fake device (latencies and durations in seconds)."""
+        self.latency = latency
+        self.jitter = jitter
+        self.snapshot_latency = snapshot_latency
+        self.playback_duration = playback_duration
+        self._playing_until = 0.0
+        self.status = dict(DEFAULT_STATUS)
+        self.requests: Counter[str] = Counter()
+        self.max_concurrency = 0
+
+        self._lock = asyncio.Lock() if serialize else None
+        self._active = 0
+        self._runner: web.AppRunner | None = None
+        self.port: int | None = None
+
+    @property
+    def host(self) -> str:
+        """Return the host:port to give to KarotzApiClient."""
+        return f"127.0.0.1:{self.port}"
+
+    def reset_counters(self) -> None:
+        """Forget the requests seen so far."""
+        self.requests.clear()
+        self.max_concurrency = 0
+
+    async def start(self) -> None:
+        """Start serving on a random loopback port."""
+        app = web.Application()
+        app.router.add_get("/cgi-bin/{endpoint}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", 0).start()
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self) -> None:
+        """Stop the server."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        """Serve one CGI call, one at a time when serialized."""
+        endpoint = request.match_info["endpoint"]
+        self.requests[endpoint] += 1
+        if self._lock is None:
+            return await self._run(endpoint, request)
+        async with self._lock:
+            return await self._run(endpoint, request)
+
+    async def _run(self, endpoint: str, request: web.Request) -> web.Response:
+        """Simulate the script run time and build the response."""
+        self._active += 1
+        self.max_concurrency = max(self.max_concurrency, self._active)
+        try:
+            base = self.snapshot_latency if endpoint == "snapshot_view" else self.latency
+            await asyncio.sleep(max(base + random.uniform(-self.jitter, self.jitter), 0))
+            return self._respond(endpoint, request.query)
+        finally:
+            self._active -= 1
+
+    def _respond(self, endpoint: str, query: Any) -> web.Response:
+        """Return what the real scripts return (JSON served as text/plain)."""
+        if endpoint == "status":
+            return web.Response(text=json.dumps(self.status), content_type="text/plain")
+        if endpoint == "snapshot_view":
+            return web.Response(body=FAKE_JPEG, content_type="image/jpeg")
+
+        if endpoint == "leds" and "color" in query:
+            self.status["led_color"] = query["color"].upper()
+            self.status["led_pulse"] = query.get("pulse", "0")
+        elif endpoint == "sleep":
+            self.status["sleep"] = "1"
+        elif endpoint == "wakeup":
+            self.status["sleep"] = "0"
+        elif endpoint == "sound_control" and query.get("cmd") == "vol":
+            self.status["volume"] = query.get("v", self.status["volume"])
+        elif endpoint in ("sound", "tts", "moods", "radio"):
+            # Chaque lecture dure playback_duration secondes
+            self._playing_until = asyncio.get_running_loop().time() + self.playback_duration
+        elif endpoint == "sound_control":
+            # Comme le vrai script : rien en cours -> message d'erreur
+            if asyncio.get_running_loop().time() >= self._playing_until:
+                return web.Response(
+                    text=json.dumps({"return": "1", "msg": "No sound currently playing."}),
+                    content_type="text/plain",
+                )
+            if query.get("cmd") == "quit":
+                self._playing_until = 0.0
+            elif query.get("cmd") not in ("pause", "volup", "voldown"):
+                return web.Response(
+                    text=json.dumps({"return": "1", "msg": "Unknown command."}),
+                    content_type="text/plain",
+                )
+
+        return web.Response(text=json.dumps({"return": "0"}), content_type="text/plain")
@@ -0,0 +1,286 @@
+"""Run the OpenKarotz benchmarks against local fake Karotz devices.
+
+From the repository root, in an environment where Home Assistant is
+installed:
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --compare results.json
+
+Results are JSON (one entry per workload) so runs on different commits can be
+compared with --compare.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from functools import partial
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.openkarotz.api import KarotzApiClient
+from custom_components.openkarotz.coordinator import KarotzCoordinator
+from custom_components.openkarotz.scheduler import KarotzPollScheduler
+from custom_components.openkarotz.snapshot import KarotzSnapshotCache
+
+from .fake_karotz import FakeKarotz
+
+
+class BenchContext:
+    """Fake devices and the integration objects driving them."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        fakes: list[FakeKarotz],
+        clients: list[KarotzApiClient],
+        coordinators: list[KarotzCoordinator],
+        args: argparse.Namespace,
+    ) -> None:
+        """Initialize the context."""
+        self.hass = hass
+        self.fakes = fakes
+        self.clients = clients
+        self.coordinators = coordinators
+        self.args = args
+
+
+async def _timed(operation: Callable[[], Awaitable[Any]]) -> float:
+    """Run one operation and return its latency in milliseconds."""
+    started = time.perf_counter()
+    await operation()
+    return (time.perf_counter() - started) * 1000
+
+
+async def bench_status_polling(ctx: BenchContext) -> list[float]:
+    """Every coordinator of the fleet refreshes at once, several rounds."""
+    latencies: list[float] = []
+    for _ in range(ctx.args.rounds):
+        latencies += await asyncio.gather(
+            *(_timed(coordinator.async_refresh) for coordinator in ctx.coordinators)
+        )
+    return latencies
+
+
+async def bench_led_burst(ctx: BenchContext) -> list[float]:
+    """An automation firing many LED changes at the same rabbit."""
+    client = ctx.clients[0]
+    latencies: list[float] = []
+    for _ in range(ctx.args.rounds):
+        latencies += await asyncio.gather(
+            *(
+                _timed(partial(client.async_set_led, color=f"{index * 4:02X}00FF"))
+                for index in range(ctx.args.burst)
+            )
+        )
+    return latencies
+
+
+async def bench_tts_sound_sequence(ctx: BenchContext) -> list[float]:
+    """Announcements: TTS, ears, a sound, then the LED back, in sequence."""
+    client = ctx.clients[0]
+    latencies: list[float] = []
+    for index in range(ctx.args.rounds):
+        latencies.append(await _timed(partial(client.async_tts, f"Annonce numéro {index}")))
+        latencies.append(await _timed(partial(client.async_set_ears, 16, 16)))
+        latencies.append(
+            await _timed(partial(client.async_play_sound, "http://127.0.0.1/ding.mp3"))
+        )
+        latencies.append(await _timed(partial(client.async_set_led, color="000000")))
+    return latencies
+
+
+async def bench_snapshot_storm(ctx: BenchContext) -> list[float]:
+    """Many dashboards refreshing the camera at the same moment."""
+    snapshots = KarotzSnapshotCache(ctx.hass, ctx.clients[0], ctx.args.snapshot_ttl)
+    latencies: list[float] = []
+    for _ in range(ctx.args.rounds):
+        latencies += await asyncio.gather(
+            *(_timed(snapshots.async_get_image) for _ in range(ctx.args.burst))
+        )
+        await asyncio.sleep(ctx.args.snapshot_ttl)
+    return latencies
+
+
+WORKLOADS: dict[str, Callable[[BenchContext], Awaitable[list[float]]]] = {
+    "status_polling": bench_status_polling,
+    "led_burst": bench_led_burst,
+    "tts_sound_sequence": bench_tts_sound_sequence,
+    "snapshot_storm": bench_snapshot_storm,
+}
+
+
+def _quantiles(latencies: list[float]) -> dict[str, float]:
+    """Return p50/p95/p99/max of a list of latencies (ms)."""
+    if len(latencies) < 2:
+        value = round(latencies[0], 2) if latencies else 0.0
+        return {"p50_ms": value, "p95_ms": value, "p99_ms": value, "max_ms": value}
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50_ms": round(cuts[49], 2),
+        "p95_ms": round(cuts[94], 2),
+        "p99_ms": round(cuts[98], 2),
+        "max_ms": round(max(latencies), 2),
+    }
+
+
+async def _run_workload(
+    ctx: BenchContext, workload: Callable[[BenchContext], Awaitable[list[float]]]
+) -> dict[str, Any]:
+    """Run one workload and collect throughput, tail latency and memory."""
+    for fake in ctx.fakes:
+        fake.reset_counters()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    latencies = await workload(ctx)
+    duration = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    device_requests: Counter[str] = Counter()
+    for fake in ctx.fakes:
+        device_requests.update(fake.requests)
+
+    return {
+        "operations": len(latencies),
+        "duration_s": round(duration, 3),
+        "throughput_ops": round(len(latencies) / duration, 2) if duration else None,
+        **_quantiles(latencies),
+        "peak_memory_kib": round(peak / 1024, 1),
+        "device_requests": dict(device_requests),
+        "device_max_concurrency": max(fake.max_concurrency for fake in ctx.fakes),
+    }
+
+
+def _git_revision() -> str | None:
+    """Return the current commit, if run from a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def async_run(args: argparse.Namespace) -> dict[str, Any]:
+    """Start the fake devices, run the selected workloads and return results."""
+    fakes = [
+        FakeKarotz(
+            latency=args.latency / 1000,
+            jitter=args.jitter / 1000,
+            serialize=not args.no_serialize,
+            snapshot_latency=args.snapshot_latency / 1000,
+        )
+        for _ in range(args.fleet)
+    ]
+    for fake in fakes:
+        await fake.start()
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        scheduler = KarotzPollScheduler(hass)
+        clients: list[KarotzApiClient] = []
+        coordinators: list[KarotzCoordinator] = []
+        for index, fake in enumerate(fakes):
+            client = KarotzApiClient(hass, fake.host, dedicated_session=True)
+            coordinator = KarotzCoordinator(hass, client, scheduler, f"bench_{index}")
+            scheduler.async_register(f"bench_{index}", coordinator)
+            clients.append(client)
+            coordinators.append(coordinator)
+
+        ctx = BenchContext(hass, fakes, clients, coordinators, args)
+        results: dict[str, Any] = {}
+        try:
+            for name in args.workloads:
+                print(f"Running {name}...", file=sys.stderr)
+                results[name] = await _run_workload(ctx, WORKLOADS[name])
+        finally:
+            for client in clients:
+                await client.async_shutdown()
+            for fake in fakes:
+                await fake.stop()
+            await hass.async_stop(force=True)
+
+    return {
+        "revision": _git_revision(),
+        "timestamp": int(time.time()),
+        "config": {
+            "fleet": args.fleet,
+            "rounds": args.rounds,
+            "burst": args.burst,
+            "latency_ms": args.latency,
+            "jitter_ms": args.jitter,
+            "snapshot_latency_ms": args.snapshot_latency,
+            "snapshot_ttl_s": args.snapshot_ttl,
+            "serialized": not args.no_serialize,
+        },
+        "workloads": results,
+    }
+
+
+def _compare(current: dict[str, Any], baseline: dict[str, Any]) -> str:
+    """Return a table comparing throughput and p95 with a previous run."""
+    lines = [
+        f"{'workload':<22}{'throughput':>22}{'p95 (ms)':>24}",
+    ]
+    for name, result in current["workloads"].items():
+        before = baseline.get("workloads", {}).get(name)
+        if before is None:
+            lines.append(f"{name:<22}{'(new)':>22}")
+            continue
+
+        def delta(key: str) -> str:
+            old, new = before.get(key), result.get(key)
+            if not old or new is None:
+                return f"{new}"
+            return f"{old} -> {new} ({(new - old) / old:+.0%})"
+
+        lines.append(f"{name:<22}{delta('throughput_ops'):>22}{delta('p95_ms'):>24}")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    """Parse arguments, run the benchmarks and write the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workloads", nargs="+", choices=list(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument("--fleet", type=int, default=10, help="number of fake rabbits")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--burst", type=int, default=20, help="concurrent calls per round")
+    parser.add_argument("--latency", type=float, default=150, help="CGI run time (ms)")
+    parser.add_argument("--jitter", type=float, default=50, help="CGI run time jitter (ms)")
+    parser.add_argument("--snapshot-latency", type=float, default=800, help="snapshot_view run time (ms)")
+    parser.add_argument("--snapshot-ttl", type=float, default=2.0, help="snapshot cache TTL (s)")
+    parser.add_argument("--no-serialize", action="store_true", help="let the fake device run CGI calls in parallel")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--compare", help="previous JSON results to compare against")
+    args = parser.parse_args()
+
+    results = asyncio.run(async_run(args))
+
+    payload = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(payload)
+    else:
+        print(payload)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            print(_compare(results, json.load(file)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
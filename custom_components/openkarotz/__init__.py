@@ -1,11 +1,11 @@
 """The OpenKarotz integration."""
 from __future__ import annotations
 
-import aiohttp.web
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant, callback
-from homeassistant.const import CONF_HOST, Platform
+from homeassistant.core import Event, HomeAssistant
+from homeassistant.const import CONF_HOST, EVENT_HOMEASSISTANT_STOP, Platform
 from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers.storage import Store
 # LIGNES MODIFIÉES
 from homeassistant.components.webhook import (
     async_generate_id,
@@ -14,9 +14,33 @@ from homeassistant.components.webhook import (
 )
 from homeassistant.helpers.typing import ConfigType
 
+from .announce import KarotzAnnouncementQueue
 from .api import KarotzApiClient
+from .broadcast import async_register_services
+from .catalog import KarotzCatalogCoordinator
 from .coordinator import KarotzCoordinator
-from .const import DOMAIN, LOGGER
+from .events import KarotzEventDeduplicator, KarotzWebhookRoute, handle_webhook
+from .media import KarotzMediaCache, KarotzMediaView
+from .playback import KarotzPlaybackTracker
+from .scheduler import KarotzPollScheduler
+from .snapshot import KarotzSnapshotCache
+from .speech import KarotzSpeechPipeline, KarotzTtsCache
+from .const import (
+    BUTTON_EVENT_HOLDOFF,
+    CATALOG_STORAGE_VERSION,
+    CONF_DEDICATED_SESSION,
+    CONF_RFID_HOLDOFF,
+    CONF_SNAPSHOT_TTL,
+    CONF_TTS_CACHE,
+    DEFAULT_DEDICATED_SESSION,
+    DEFAULT_RFID_HOLDOFF,
+    DEFAULT_SNAPSHOT_TTL,
+    DEFAULT_TTS_CACHE,
+    DOMAIN,
+    LOGGER,
+    STATUS_STORAGE_VERSION,
+    TTS_CACHE_STORAGE_VERSION,
+)
 
 # Plateformes à charger
 PLATFORMS: list[Platform] = [
@@ -26,30 +50,93 @@ PLATFORMS: list[Platform] = [
     Platform.CAMERA,
     Platform.BINARY_SENSOR, # Pour le statut "Veille"
     Platform.SENSOR,         # Pour l'URL du Webhook
+    Platform.SELECT,         # Effet LED et catalogues
 ]
 
 async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     """Set up the OpenKarotz component."""
     hass.data[DOMAIN] = {}
     hass.data[DOMAIN]["webhooks"] = {}
+    # Répartit les polls de tous les lapins configurés
+    hass.data[DOMAIN]["scheduler"] = KarotzPollScheduler(hass)
+    # Cache audio transcodé, partagé par tous les lapins et servi en local
+    media = KarotzMediaCache(hass)
+    await media.async_load()
+    hass.data[DOMAIN]["media"] = media
+    hass.http.register_view(KarotzMediaView(media))
+
+    async def _async_stop(event: Event) -> None:
+        await media.async_shutdown()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_stop)
+    # Services globaux (pas liés à une entité)
+    async_register_services(hass)
     return True
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up OpenKarotz from a config entry."""
-    
-    host = entry.data[CONF_HOST]
+    started = hass.loop.time()
+
+    # 1. Créer le Client API (et sa session dédiée éventuelle)
+    client = KarotzApiClient(
+        hass,
+        entry.data[CONF_HOST],
+        dedicated_session=entry.options.get(
+            CONF_DEDICATED_SESSION, DEFAULT_DEDICATED_SESSION
+        ),
+    )
+    try:
+        set_up = await _async_setup_karotz(hass, entry, client, started)
+    except Exception:
+        # Échec en cours de route : ne laisser ni session, ni webhook, ni tâche
+        await _async_teardown(hass, entry.entry_id, client)
+        raise
+    if not set_up:
+        await _async_teardown(hass, entry.entry_id, client)
+    return set_up
 
-    # 1. Créer le Client API et le Coordinateur d'état
-    client = KarotzApiClient(hass, host)
-    coordinator = KarotzCoordinator(hass, client)
+async def _async_setup_karotz(
+    hass: HomeAssistant, entry: ConfigEntry, client: KarotzApiClient, started: float
+) -> bool:
+    """Set up everything built on the client; the caller cleans up on failure."""
+    # Coordinateur d'état
+    scheduler: KarotzPollScheduler = hass.data[DOMAIN]["scheduler"]
+    coordinator = KarotzCoordinator(hass, client, scheduler, entry.entry_id)
+    entry.async_on_unload(scheduler.async_register(entry.entry_id, coordinator))
 
-    # 2. Premier rafraîchissement (lit /cgi-bin/status)
-    # Cela valide aussi la connexion avant de continuer.
-    await coordinator.async_config_entry_first_refresh()
+    # 2. Dernier statut connu : les entités démarrent avec, et le premier
+    # vrai rafraîchissement se fait en arrière-plan (un lapin éteint ne
+    # retarde plus le démarrage de Home Assistant).
+    restored = await coordinator.async_restore()
+    if not restored:
+        # Jamais lu : le premier rafraîchissement (lit /cgi-bin/status)
+        # valide aussi la connexion avant de continuer.
+        await coordinator.async_config_entry_first_refresh()
+
+    # Catalogues lus depuis le disque : jamais d'attente sur les CGI de listing
+    catalog = KarotzCatalogCoordinator(hass, client, coordinator, entry.entry_id)
+    await catalog.async_load()
+
+    # 3. Créer l'appareil dans le registre
+    device_registry = dr.async_get(hass)
+    device = device_registry.async_get_or_create(
+        config_entry_id=entry.entry_id,
+        identifiers={(DOMAIN, entry.entry_id)},
+        name=entry.title,
+        manufacturer="OpenKarotz",
+        model="Karotz",
+    )
 
-    # 3. Enregistrer le Webhook "push"
+    # 4. Enregistrer le Webhook "push", avec sa route webhook -> appareil
+    # résolue une fois pour toutes
     # LIGNE MODIFIÉE (suppression de 'webhook.')
     webhook_id = async_generate_id()
+    dedup = KarotzEventDeduplicator(
+        {
+            "rfid": entry.options.get(CONF_RFID_HOLDOFF, DEFAULT_RFID_HOLDOFF),
+            "button": BUTTON_EVENT_HOLDOFF,
+        }
+    )
     try:
         # LIGNE MODIFIÉE (suppression de 'webhook.')
         async_register(
@@ -63,32 +150,72 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     except ValueError:
         LOGGER.error("Impossible d'enregistrer le webhook %s, il existe déjà.", webhook_id)
         return False
+    hass.data[DOMAIN]["webhooks"][webhook_id] = KarotzWebhookRoute(
+        entry.entry_id, device.id, device.name or entry.title, coordinator, dedup
+    )
 
-    # 4. Stocker les objets pour les entités
+    # 5. Stocker les objets pour les entités
+    playback = KarotzPlaybackTracker(hass, client)
+    tts_cache = None
+    if entry.options.get(CONF_TTS_CACHE, DEFAULT_TTS_CACHE):
+        tts_cache = KarotzTtsCache(hass, coordinator, entry.entry_id)
+        await tts_cache.async_load()
+    speech = KarotzSpeechPipeline(hass, client, playback, tts_cache)
     hass.data[DOMAIN][entry.entry_id] = {
         "client": client,
         "coordinator": coordinator,
+        "catalog": catalog,
+        "playback": playback,
+        "speech": speech,
+        "announcements": KarotzAnnouncementQueue(hass, client, playback, speech),
         "webhook_id": webhook_id,
+        "snapshots": KarotzSnapshotCache(
+            hass,
+            client,
+            entry.options.get(CONF_SNAPSHOT_TTL, DEFAULT_SNAPSHOT_TTL),
+        ),
     }
-    
-    # 5. Stocker le mapping Webhook -> Entry
-    hass.data[DOMAIN]["webhooks"][webhook_id] = entry.entry_id
 
-    # 6. Créer l'appareil dans le registre
-    device_registry = dr.async_get(hass)
-    device_registry.async_get_or_create(
-        config_entry_id=entry.entry_id,
-        identifiers={(DOMAIN, entry.entry_id)},
-        name=entry.title,
-        manufacturer="OpenKarotz",
-        model="Karotz",
+    # 6. Charger les plateformes (light, camera, etc.)
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+
+    # Relire les catalogues en arrière-plan quand les compteurs changent
+    entry.async_on_unload(catalog.async_start())
+
+    LOGGER.debug(
+        "Karotz %s configuré en %.2f s (statut %s)",
+        entry.title,
+        hass.loop.time() - started,
+        "restauré" if restored else "lu sur le lapin",
     )
+    if restored:
+        entry.async_create_background_task(
+            hass,
+            _async_first_refresh(coordinator, entry, started),
+            f"{DOMAIN}_first_refresh_{entry.entry_id}",
+        )
 
-    # 7. Charger les plateformes (light, camera, etc.)
-    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    # 7. Recharger l'entrée quand les options changent
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
 
     return True
 
+async def _async_first_refresh(
+    coordinator: KarotzCoordinator, entry: ConfigEntry, started: float
+) -> None:
+    """Replace the restored status with a fresh one, in the background."""
+    await coordinator.async_refresh()
+    LOGGER.debug(
+        "Premier statut de %s %s après %.2f s",
+        entry.title,
+        "reçu" if coordinator.last_update_success else "indisponible",
+        coordinator.hass.loop.time() - started,
+    )
+
+async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload the config entry when its options change."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     # 1. Décharger les plateformes
@@ -96,87 +223,41 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     if not unload_ok:
         return False
 
-    # 2. Désenregistrer le Webhook
-    data = hass.data[DOMAIN][entry.entry_id]
-    webhook_id = data.get("webhook_id")
-    if webhook_id:
+    # 2. Webhook, tâches de fond, pipeline et session dédiée
+    await _async_teardown(
+        hass, entry.entry_id, hass.data[DOMAIN][entry.entry_id]["client"]
+    )
+    return True
+
+async def _async_teardown(
+    hass: HomeAssistant, entry_id: str, client: KarotzApiClient
+) -> None:
+    """Release what a Karotz holds, whether its setup completed or not."""
+    # 1. Désenregistrer le Webhook et nettoyer le mapping
+    webhooks: dict[str, KarotzWebhookRoute] = hass.data[DOMAIN]["webhooks"]
+    for webhook_id in [
+        webhook_id for webhook_id, route in webhooks.items() if route.entry_id == entry_id
+    ]:
         try:
             # LIGNE MODIFIÉE (suppression de 'webhook.')
             async_unregister(hass, webhook_id)
             LOGGER.info("Webhook %s désenregistré.", webhook_id)
         except ValueError:
             LOGGER.warning("Webhook %s déjà désenregistré.", webhook_id)
-        
-        # Nettoyer le mapping
-        hass.data[DOMAIN]["webhooks"].pop(webhook_id, None)
-
-    # 3. Nettoyer hass.data
-    hass.data[DOMAIN].pop(entry.entry_id)
-
-    return True
+        webhooks.pop(webhook_id, None)
 
-@callback
-async def handle_webhook(
-    hass: HomeAssistant, webhook_id: str, request: aiohttp.web.Request
-) -> aiohttp.web.Response:
-    """Handle incoming webhook from Karotz dbus_watcher."""
-    
-    # 1. Trouver l'appareil (entry_id) qui correspond à ce webhook
-    entry_id = hass.data[DOMAIN]["webhooks"].get(webhook_id)
-    if not entry_id:
-        LOGGER.warning("Webhook reçu pour un ID inconnu: %s", webhook_id)
-        return aiohttp.web.Response(status=404, text="Webhook ID not found")
-
-    # 2. Récupérer l'appareil HA
-    device_registry = dr.async_get(hass)
-    device = device_registry.async_get_device(identifiers={(DOMAIN, entry_id)})
-    if not device:
-        LOGGER.warning("Webhook %s reçu mais l'appareil n'est pas trouvé.", webhook_id)
-        return aiohttp.web.Response(status=404, text="Device not found")
+    # 2. Arrêter le flux caméra, les annonces et nettoyer hass.data
+    if (data := hass.data[DOMAIN].pop(entry_id, None)) is not None:
+        await data["snapshots"].async_shutdown()
+        await data["announcements"].async_shutdown()
+        await data["speech"].async_shutdown()
+        await data["playback"].async_shutdown()
 
-    # 3. Parser le JSON (POST)
-    try:
-        data = await request.json()
-        event_type = data.get("event_type")
-        LOGGER.debug("Webhook reçu de %s: %s", device.name, data)
-    except Exception as err:
-        LOGGER.warning("Erreur de parsing JSON du webhook Karotz: %s", err)
-        return aiohttp.web.Response(status=400, text="Invalid JSON")
-
-    # 4. Traiter l'événement
-    if event_type == "rfid":
-        tag_id = data.get("rfid_id")
-        if not tag_id:
-            LOGGER.warning("Événement RFID reçu sans 'rfid_id'")
-            return aiohttp.web.Response(status=400, text="Missing rfid_id")
-            
-        LOGGER.info("Scan RFID natif reçu de %s, tag: %s", device.name, tag_id)
-        
-        # === C'est ici qu'on s'intègre au système RFID natif de HA ===
-        hass.bus.async_fire(
-            "tag_scanned",
-            {"tag_id": tag_id, "device_id": device.id},
-        )
-        
-    elif event_type == "button":
-        event = data.get("event") # ex: "click", "dclick", "lclick_start"
-        if not event:
-            LOGGER.warning("Événement Bouton reçu sans 'event'")
-            return aiohttp.web.Response(status=400, text="Missing event")
-            
-        LOGGER.info("Événement Bouton reçu de %s: %s", device.name, event)
-        
-        # === C'est ici qu'on déclenche l'événement pour les automations ===
-        # Cet événement sera attrapé par device_trigger.py
-        hass.bus.async_fire(
-            f"{DOMAIN}_event",
-            {
-                "device_id": device.id,
-                "type": event,
-            },
-        )
-    else:
-        LOGGER.warning("Webhook reçu avec event_type inconnu: %s", event_type)
-        return aiohttp.web.Response(status=400, text="Unknown event_type")
+    # 3. Arrêter le pipeline et fermer la session dédiée
+    await client.async_shutdown()
 
-    return aiohttp.web.Response(status=200, text="OK")
\ No newline at end of file
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the data stored on disk for a deleted config entry."""
+    await Store(hass, STATUS_STORAGE_VERSION, f"{DOMAIN}.status.{entry.entry_id}").async_remove()
+    await Store(hass, CATALOG_STORAGE_VERSION, f"{DOMAIN}.catalog.{entry.entry_id}").async_remove()
+    await Store(hass, TTS_CACHE_STORAGE_VERSION, f"{DOMAIN}.tts_cache.{entry.entry_id}").async_remove()
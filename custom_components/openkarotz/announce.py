@@ -0,0 +1,329 @@
+"""Priority announcement queue for OpenKarotz."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from functools import partial
+import heapq
+import itertools
+from typing import Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+
+from .api import KarotzApiClient
+from .const import (
+    ANNOUNCE_DEFAULT_PRIORITY,
+    ANNOUNCE_MAX_AGE,
+    ANNOUNCE_PRIORITIES,
+    ANNOUNCE_RADIO_PRIORITY,
+    LOGGER,
+)
+from .playback import KarotzPlaybackTracker
+from .speech import KarotzSpeechPipeline
+
+
+class KarotzAnnouncement:
+    """Something to play: a TTS, a sound, a mood or a radio."""
+
+    __slots__ = (
+        "key",
+        "priority",
+        "play",
+        "tracks_itself",
+        "stream",
+        "enqueued_at",
+        "max_age",
+        "release",
+    )
+
+    def __init__(
+        self,
+        key: Hashable,
+        priority: int,
+        play: Callable[[], Awaitable[bool]],
+        tracks_itself: bool,
+        stream: bool,
+        enqueued_at: float,
+        max_age: float | None,
+        release: Callable[[], None] | None,
+    ) -> None:
+        """Initialize the announcement."""
+        self.key = key
+        self.priority = priority
+        self.play = play
+        # Les TTS découpés démarrent eux-mêmes le suivi de chaque morceau
+        self.tracks_itself = tracks_itself
+        # Radio ou flux : sans fin prévisible, suivi jusqu'à l'arrêt
+        self.stream = stream
+        self.enqueued_at = enqueued_at
+        self.max_age = max_age
+        # Appelé quand l'annonce quitte la file (fichier du cache à libérer)
+        self.release = release
+
+    @callback
+    def async_release(self) -> None:
+        """Call the release callback, once."""
+        if self.release is not None:
+            release, self.release = self.release, None
+            release()
+
+
+class KarotzAnnouncementQueue:
+    """Play announcements one after the other, highest priority first.
+
+    An announcement of higher priority than the one playing interrupts it
+    (an alarm stops the radio). Identical pending announcements are merged,
+    and those that waited longer than their max age are dropped. The next one
+    starts as soon as the playback tracker reports the current one ended.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        client: KarotzApiClient,
+        tracker: KarotzPlaybackTracker,
+        speech: KarotzSpeechPipeline,
+    ) -> None:
+        """Initialize the queue."""
+        self._hass = hass
+        self._client = client
+        self._tracker = tracker
+        self._speech = speech
+        self._heap: list[tuple[int, int, KarotzAnnouncement]] = []
+        self._pending: dict[Hashable, KarotzAnnouncement] = {}
+        self._sequence = itertools.count()
+        self._current: KarotzAnnouncement | None = None
+        self._lock = asyncio.Lock()
+        self._listeners: list[Callable[[], None]] = []
+        self.last_wait: float | None = None
+        self.dropped = 0
+        self.merged = 0
+        self.preempted = 0
+
+        tracker.async_add_listener(self._async_playback_ended)
+
+    @property
+    def playing(self) -> bool:
+        """Return True while an announcement is playing."""
+        return self._current is not None
+
+    @property
+    def current_key(self) -> Hashable | None:
+        """Return the key of the announcement playing."""
+        return self._current.key if self._current is not None else None
+
+    def is_pending(self, key: Hashable) -> bool:
+        """Return True if an announcement with this key waits in the queue."""
+        return key in self._pending
+
+    @property
+    def depth(self) -> int:
+        """Return the number of pending announcements."""
+        return len(self._pending)
+
+    @property
+    def current_priority(self) -> str | None:
+        """Return the priority name of the announcement playing."""
+        if self._current is None:
+            return None
+        return next(
+            name
+            for name, value in ANNOUNCE_PRIORITIES.items()
+            if value == self._current.priority
+        )
+
+    @callback
+    def async_add_listener(self, update_callback: Callable[[], None]) -> CALLBACK_TYPE:
+        """Register a callback invoked when the queue or the current item changes."""
+        self._listeners.append(update_callback)
+
+        @callback
+        def remove_listener() -> None:
+            self._listeners.remove(update_callback)
+
+        return remove_listener
+
+    @callback
+    def _async_notify(self) -> None:
+        """Notify the listeners."""
+        for update_callback in list(self._listeners):
+            update_callback()
+
+    async def async_submit(
+        self,
+        key: Hashable,
+        priority: str,
+        play: Callable[[], Awaitable[bool]],
+        tracks_itself: bool = False,
+        max_age: float | None = ANNOUNCE_MAX_AGE,
+        stream: bool = False,
+        release: Callable[[], None] | None = None,
+    ) -> str:
+        """Queue an announcement; it starts now if nothing plays.
+
+        release is called once the announcement has left the queue: started,
+        dropped or merged into an identical pending one.
+        Return "playing" if it started, "queued" if it waits (or preempts the
+        current one), "merged" if it was already pending, "failed" otherwise.
+        """
+        level = ANNOUNCE_PRIORITIES[priority]
+
+        if (pending := self._pending.get(key)) is not None:
+            # Même annonce déjà en attente : on garde la plus prioritaire
+            self.merged += 1
+            if release is not None:
+                release()
+            if level > pending.priority:
+                pending.priority = level
+                self._heap = [
+                    (-entry.priority, sequence, entry) for _, sequence, entry in self._heap
+                ]
+                heapq.heapify(self._heap)
+            return "merged"
+
+        item = KarotzAnnouncement(
+            key,
+            level,
+            play,
+            tracks_itself,
+            stream,
+            self._hass.loop.time(),
+            max_age,
+            release,
+        )
+        self._pending[key] = item
+        heapq.heappush(self._heap, (-level, next(self._sequence), item))
+
+        if self._current is None:
+            await self._async_start_next()
+            if self._current is item:
+                return "playing"
+            return "queued" if self._pending.get(key) is item else "failed"
+        if level > self._current.priority:
+            LOGGER.debug("Annonce prioritaire : interruption de la lecture en cours")
+            self.preempted += 1
+            await self._async_interrupt()
+        else:
+            self._async_notify()
+        return "queued"
+
+    async def async_play_mood(
+        self, mood_id: int | str, priority: str = ANNOUNCE_DEFAULT_PRIORITY
+    ) -> str:
+        """Queue a mood (services and catalog select)."""
+        return await self.async_submit(
+            ("mood", str(mood_id)), priority, partial(self._client.async_play_mood, mood_id)
+        )
+
+    async def async_play_sound(
+        self, sound_id: str, priority: str = ANNOUNCE_DEFAULT_PRIORITY
+    ) -> str:
+        """Queue a sound stored on the rabbit."""
+        return await self.async_submit(
+            ("sound", sound_id),
+            priority,
+            partial(self._client.async_play_sound_local, sound_id),
+        )
+
+    async def async_play_radio(
+        self, radio_id: int | str, priority: str = ANNOUNCE_RADIO_PRIORITY
+    ) -> str:
+        """Queue a preset radio."""
+        return await self.async_submit(
+            ("radio", str(radio_id)),
+            priority,
+            partial(self._client.async_play_radio, radio_id),
+            stream=True,
+        )
+
+    async def _async_interrupt(self) -> None:
+        """Stop what is playing; the tracker listener then starts the next item."""
+        self._speech.async_cancel()
+        try:
+            await self._client.async_sound_control(cmd="quit")
+        except ConnectionError as err:
+            LOGGER.debug("Arrêt de la lecture impossible: %s", err)
+        finally:
+            # Lapin injoignable ou non : la file doit passer à la suite
+            self._tracker.async_stop()
+
+    async def _async_start_next(self) -> None:
+        """Start the highest-priority pending announcement that is not stale."""
+        async with self._lock:
+            while self._current is None and self._heap:
+                _, _, item = heapq.heappop(self._heap)
+                self._pending.pop(item.key, None)
+                wait = self._hass.loop.time() - item.enqueued_at
+                if item.max_age is not None and wait > item.max_age:
+                    LOGGER.debug("Annonce abandonnée après %.0f s d'attente", wait)
+                    self.dropped += 1
+                    item.async_release()
+                    continue
+
+                self._current = item
+                self.last_wait = wait
+                self._async_notify()
+                try:
+                    started = await item.play()
+                except asyncio.CancelledError:
+                    self._current = None
+                    raise
+                except Exception as err:
+                    # Lapin injoignable, média introuvable... : on passe à la suite
+                    LOGGER.warning("Annonce non jouée: %s", err)
+                    started = False
+                finally:
+                    # Le lapin a commencé à lire le fichier, ou n'en veut pas
+                    item.async_release()
+                if not started:
+                    self._current = None
+                    self._async_notify()
+                    continue
+                if not item.tracks_itself:
+                    self._tracker.async_start(stream=item.stream)
+        self._async_notify()
+
+    @callback
+    def _async_playback_ended(self) -> None:
+        """Start the next announcement when the current one has ended."""
+        # Fin d'un morceau de TTS (le suivant part tout seul), ou démarrage
+        # en cours dans _async_start_next
+        if self._speech.speaking or self._lock.locked():
+            return
+        self._current = None
+        if self._heap:
+            # _async_start_next gère les échecs de lecture de chaque annonce
+            self._hass.async_create_background_task(
+                self._async_start_next(), "openkarotz announcement"
+            )
+        else:
+            self._async_notify()
+
+    @callback
+    def _async_drop_pending(self) -> None:
+        """Forget the pending announcements."""
+        for _, _, item in self._heap:
+            item.async_release()
+        self._heap.clear()
+        self._pending.clear()
+
+    async def async_shutdown(self) -> None:
+        """Forget the pending announcements."""
+        self._async_drop_pending()
+        self._listeners.clear()
+
+    async def async_clear(self) -> None:
+        """Drop every pending announcement and stop the current one."""
+        self._async_drop_pending()
+        await self._async_interrupt()
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return queue statistics."""
+        return {
+            "depth": self.depth,
+            "current_priority": self.current_priority,
+            "last_wait": self.last_wait,
+            "dropped": self.dropped,
+            "merged": self.merged,
+            "preempted": self.preempted,
+        }
@@ -1,29 +1,306 @@
 """API Client for OpenKarotz."""
+import asyncio
 import aiohttp
+from collections.abc import Awaitable, Callable
+from contextlib import AbstractAsyncContextManager
+from functools import partial
 from typing import Any
 import json
 
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
-from homeassistant.core import HomeAssistant
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+
+from .const import (
+    BREAKER_CLOSED,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_HALF_OPEN,
+    BREAKER_OPEN,
+    BREAKER_RESET_TIMEOUT,
+    CATALOG_FETCH_TIMEOUT,
+    LOGGER,
+    NO_SOUND_PLAYING,
+    SESSION_CONNECTION_LIMIT,
+    SESSION_DNS_CACHE_TTL,
+    SESSION_KEEPALIVE_TIMEOUT,
+)
+from .metrics import OUTCOME_ERROR, OUTCOME_SUCCESS, OUTCOME_TIMEOUT, KarotzMetrics
+from .models import KarotzStatus
+
+
+def _coalesce_key(endpoint: str, params: dict[str, Any] | None) -> str | None:
+    """Return the key under which a pending command can be superseded.
+
+    Only commands that set an absolute state are coalesced: a newer one makes
+    the older one pointless. TTS, sounds, moods or relative volume steps are
+    always sent.
+    """
+    if endpoint in ("leds", "ears"):
+        return endpoint
+    if endpoint in ("sleep", "wakeup"):
+        return "sleep"
+    if endpoint == "sound_control" and params and params.get("cmd") == "vol":
+        return "volume"
+    return None
+
+
+class KarotzCircuitOpenError(ConnectionError):
+    """Raised when a request is rejected because the Karotz is unreachable."""
+
+
+class _KarotzCommand:
+    """A command waiting in the device pipeline."""
+
+    __slots__ = ("key", "send", "futures")
+
+    def __init__(
+        self,
+        key: str | None,
+        send: Callable[[], Awaitable[Any]],
+        future: asyncio.Future,
+    ) -> None:
+        """Initialize the command."""
+        self.key = key
+        self.send = send
+        self.futures = [future]
 
-from .const import LOGGER
 
 class KarotzApiClient:
     """Asynchronous client for the OpenKarotz cgi-bin API."""
 
-    def __init__(self, hass: HomeAssistant, host: str) -> None:
+    def __init__(
+        self, hass: HomeAssistant, host: str, dedicated_session: bool = False
+    ) -> None:
         """Initialize the API client."""
+        self._hass = hass
         self._host = host
         self._base_url = f"http://{self._host}/cgi-bin"
-        self._session = async_get_clientsession(hass)
+        self._owns_session = dedicated_session
+        if dedicated_session:
+            self._session = self._create_session()
+        else:
+            self._session = async_get_clientsession(hass)
         self._snapshot_error_logged = False # Garder le drapeau anti-spam
+        self._action_listeners: list[Callable[[], None]] = []
+
+        # Pipeline de commandes : les CGI du Karotz ne traitent qu'une requête
+        # à la fois, on les envoie donc une par une depuis une file unique.
+        self._queue: asyncio.Queue[_KarotzCommand] = asyncio.Queue()
+        self._pending: dict[str, _KarotzCommand] = {}
+        self._worker: asyncio.Task | None = None
+
+        # Disjoncteur (fermé / ouvert / semi-ouvert)
+        self._breaker_state = BREAKER_CLOSED
+        self._breaker_failures = 0
+        self._breaker_opened_at = 0.0
+        self._breaker_listeners: list[Callable[[str], None]] = []
+
+        # Latences et erreurs par endpoint
+        self.metrics = KarotzMetrics()
+
+        # Dernier corps brut de /status et le statut parsé correspondant
+        self._status_body: bytes | None = None
+        self._status: KarotzStatus | None = None
+        self._status_polls = 0
+        self._status_unchanged = 0
+
+    @staticmethod
+    def _create_session() -> aiohttp.ClientSession:
+        """Create a connection pool tuned for the Karotz embedded web server."""
+        # aiohttp active déjà TCP_NODELAY sur chaque connexion cliente ; ici on
+        # garde les connexions ouvertes et on évite de résoudre le nom à chaque
+        # commande.
+        connector = aiohttp.TCPConnector(
+            limit=SESSION_CONNECTION_LIMIT,
+            limit_per_host=SESSION_CONNECTION_LIMIT,
+            keepalive_timeout=SESSION_KEEPALIVE_TIMEOUT,
+            use_dns_cache=True,
+            ttl_dns_cache=SESSION_DNS_CACHE_TTL,
+        )
+        return aiohttp.ClientSession(connector=connector)
+
+    async def async_shutdown(self) -> None:
+        """Stop the command pipeline and close the dedicated session."""
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+        self._worker = None
+
+        # Les commandes encore en file ne partiront jamais
+        while not self._queue.empty():
+            command = self._queue.get_nowait()
+            for future in command.futures:
+                if not future.done():
+                    future.set_exception(
+                        ConnectionError(f"Karotz client for {self._host} was shut down")
+                    )
+        self._pending.clear()
+
+        if self._owns_session and not self._session.closed:
+            await self._session.close()
+
+    @callback
+    def async_add_action_listener(self, action_callback: Callable[[], None]) -> CALLBACK_TYPE:
+        """Register a callback invoked each time an action is sent to the device."""
+        self._action_listeners.append(action_callback)
+
+        @callback
+        def remove_listener() -> None:
+            self._action_listeners.remove(action_callback)
+
+        return remove_listener
+
+    @property
+    def available(self) -> bool:
+        """Return True unless the circuit breaker is open or half-open."""
+        return self._breaker_state == BREAKER_CLOSED
+
+    @property
+    def breaker_state(self) -> str:
+        """Return the circuit breaker state."""
+        return self._breaker_state
+
+    @callback
+    def async_add_breaker_listener(self, state_callback: Callable[[str], None]) -> CALLBACK_TYPE:
+        """Register a callback invoked when the circuit breaker changes state."""
+        self._breaker_listeners.append(state_callback)
+
+        @callback
+        def remove_listener() -> None:
+            self._breaker_listeners.remove(state_callback)
+
+        return remove_listener
+
+    @callback
+    def _set_breaker_state(self, state: str) -> None:
+        """Change the breaker state and notify listeners."""
+        if state == self._breaker_state:
+            return
+        if state == BREAKER_OPEN:
+            LOGGER.warning(
+                "Karotz %s injoignable, commandes suspendues pendant %s s",
+                self._host,
+                BREAKER_RESET_TIMEOUT,
+            )
+        elif state == BREAKER_CLOSED:
+            LOGGER.info("Karotz %s de nouveau joignable", self._host)
+        self._breaker_state = state
+        for state_callback in list(self._breaker_listeners):
+            state_callback(state)
+
+    @callback
+    def _breaker_check(self, probe: bool = False) -> None:
+        """Raise KarotzCircuitOpenError if the breaker rejects the request.
+
+        Once the reset timeout has elapsed, one probe request is let through.
+        """
+        if self._breaker_state == BREAKER_CLOSED:
+            return
+        if (
+            probe
+            and self._breaker_state == BREAKER_OPEN
+            and self._hass.loop.time() - self._breaker_opened_at >= BREAKER_RESET_TIMEOUT
+        ):
+            self._set_breaker_state(BREAKER_HALF_OPEN)
+            return
+        raise KarotzCircuitOpenError(f"Karotz at {self._host} is unreachable")
+
+    @callback
+    def _breaker_success(self) -> None:
+        """Record a request the device answered."""
+        self._breaker_failures = 0
+        self._set_breaker_state(BREAKER_CLOSED)
+
+    @callback
+    def _breaker_failure(self) -> None:
+        """Record a connection failure or timeout."""
+        self._breaker_failures += 1
+        if (
+            self._breaker_state == BREAKER_HALF_OPEN
+            or self._breaker_failures >= BREAKER_FAILURE_THRESHOLD
+        ):
+            self._breaker_opened_at = self._hass.loop.time()
+            self._set_breaker_state(BREAKER_OPEN)
+
+    async def _async_enqueue(
+        self, key: str | None, send: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Queue a request in the device pipeline and wait for its result."""
+        future: asyncio.Future = self._hass.loop.create_future()
+
+        pending = self._pending.get(key) if key is not None else None
+        if pending is not None:
+            # Last-write-wins : la commande en attente part avec les nouveaux
+            # paramètres, à sa place dans la file, et répond aux deux appelants.
+            LOGGER.debug("Commande %s fusionnée avec une commande en attente", key)
+            pending.send = send
+            pending.futures.append(future)
+        else:
+            command = _KarotzCommand(key, send, future)
+            if key is not None:
+                self._pending[key] = command
+            self._queue.put_nowait(command)
+
+        if self._worker is None or self._worker.done():
+            self._worker = self._hass.async_create_background_task(
+                self._async_run_pipeline(), name=f"openkarotz pipeline {self._host}"
+            )
+
+        return await future
+
+    async def _async_run_pipeline(self) -> None:
+        """Send queued commands one at a time until the queue is empty."""
+        while not self._queue.empty():
+            command = self._queue.get_nowait()
+            if command.key is not None:
+                self._pending.pop(command.key, None)
+
+            try:
+                result = await command.send()
+            except asyncio.CancelledError:
+                # Arrêt du client : la commande en cours ne répondra jamais,
+                # ses appelants ne doivent pas attendre indéfiniment
+                for future in command.futures:
+                    if not future.done():
+                        future.set_exception(
+                            ConnectionError(f"Karotz client for {self._host} was shut down")
+                        )
+                raise
+            except Exception as err:
+                for future in command.futures:
+                    if not future.done():
+                        future.set_exception(err)
+            else:
+                for future in command.futures:
+                    if not future.done():
+                        future.set_result(result)
 
     async def _request(self, endpoint: str, params: dict[str, Any] | None = None) -> bool:
+        """Queue a GET request to a cgi-bin ACTION endpoint."""
+        # Lapin injoignable : refuser tout de suite plutôt qu'attendre 10 s
+        self._breaker_check()
+
+        # Prévenir le coordinateur : l'état du lapin va probablement changer
+        for action_callback in list(self._action_listeners):
+            action_callback()
+
+        return await self._async_enqueue(
+            _coalesce_key(endpoint, params),
+            partial(self._async_send_action, endpoint, params),
+        )
+
+    async def _async_send_action(
+        self, endpoint: str, params: dict[str, Any] | None = None
+    ) -> bool:
         """Make a GET request to a cgi-bin ACTION endpoint."""
         url = f"{self._base_url}/{endpoint}"
-        
+
+        # Le disjoncteur a pu s'ouvrir pendant que la commande attendait
+        self._breaker_check()
+
+        started = self._hass.loop.time()
+        outcome = OUTCOME_ERROR
         try:
             async with self._session.get(url, params=params, timeout=10) as response:
+                self._breaker_success()
                 response.raise_for_status() # Lève une exception pour 4xx/5xx
                 
                 # Les actions (leds, tts) renvoient du JSON avec un content-type
@@ -32,10 +309,11 @@ class KarotzApiClient:
                 
                 if data and data.get("return") == "0":
                     LOGGER.debug("Action %s réussie", endpoint)
+                    outcome = OUTCOME_SUCCESS
                     return True
                 
                 msg = data.get("msg")
-                if endpoint == "sound_control" and msg == "No sound currently playing.":
+                if endpoint == "sound_control" and msg == NO_SOUND_PLAYING:
                     LOGGER.debug("Action sound_control échouée (normal): %s", msg)
                 else:
                     LOGGER.warning("Action %s échouée (API error): %s", endpoint, data)
@@ -44,29 +322,105 @@ class KarotzApiClient:
 
         except aiohttp.ClientConnectorError:
             LOGGER.error("Échec de connexion au Karotz à %s", self._host)
+            self._breaker_failure()
             raise ConnectionError(f"Cannot connect to Karotz at {self._host}")
+        except TimeoutError:
+            LOGGER.warning("Karotz %s injoignable (%s): timeout", self._host, endpoint)
+            outcome = OUTCOME_TIMEOUT
+            self._breaker_failure()
+            return False
+        except aiohttp.ClientConnectionError as err:
+            LOGGER.warning("Karotz %s injoignable (%s): %s", self._host, endpoint, err)
+            self._breaker_failure()
+            return False
         except aiohttp.ClientError as err:
             LOGGER.warning("Erreur API Karotz (%s): %s", endpoint, err)
             return False
         except Exception as err:
             LOGGER.error("Erreur inattendue API Karotz (%s): %s", endpoint, err)
             return False
+        finally:
+            # L'action a pu changer le statut (et les entités vont modifier
+            # le statut courant de façon optimiste) : on re-parse au prochain poll
+            self._status_body = None
+            self.metrics.record(endpoint, self._hass.loop.time() - started, outcome)
+
+    @property
+    def status_stats(self) -> dict[str, Any]:
+        """Return how many status polls returned an unchanged body."""
+        return {
+            "polls": self._status_polls,
+            "unchanged": self._status_unchanged,
+            "unchanged_ratio": (
+                round(self._status_unchanged / self._status_polls, 3)
+                if self._status_polls
+                else None
+            ),
+        }
 
-    async def async_get_status(self) -> dict[str, Any] | None:
-        """Get the device status (from /cgi-bin/status). This endpoint is special."""
+    async def async_get_status(
+        self, slot: Callable[[], AbstractAsyncContextManager[None]] | None = None
+    ) -> KarotzStatus | None:
+        """Get the device status (from /cgi-bin/status). This endpoint is special.
+
+        slot, if given, is held only while the request is sent, not while it
+        waits behind the commands already queued for this rabbit.
+        """
+        # Seule requête autorisée à sonder un lapin injoignable
+        self._breaker_check(probe=True)
+
+        # Les lectures de statut concurrentes partagent une seule requête
+        return await self._async_enqueue(
+            "status", partial(self._async_fetch_status, slot)
+        )
+
+    async def _async_fetch_status(
+        self, slot: Callable[[], AbstractAsyncContextManager[None]] | None
+    ) -> KarotzStatus | None:
+        """Fetch /cgi-bin/status, inside slot if given."""
+        if slot is None:
+            return await self._async_read_status()
+        async with slot():
+            return await self._async_read_status()
+
+    async def _async_read_status(self) -> KarotzStatus | None:
+        """Fetch and parse /cgi-bin/status."""
         url = f"{self._base_url}/status"
+        started = self._hass.loop.time()
+        outcome = OUTCOME_ERROR
         try:
             async with self._session.get(url, timeout=10) as response:
+                self._breaker_success()
                 response.raise_for_status()
-                # Lire le texte brut (car Content-Type=text/plain) et parser manuellement
-                raw_data = await response.text()
+                # Lire le corps brut (car Content-Type=text/plain) et parser manuellement
+                raw_data = await response.read()
+                outcome = OUTCOME_SUCCESS
+                self._status_polls += 1
+
+                # Corps identique au précédent : on réutilise le même objet, que
+                # le coordinateur reconnaît sans notifier personne
+                if raw_data == self._status_body:
+                    self._status_unchanged += 1
+                    return self._status
+
                 data = json.loads(raw_data)
                 # /status n'a pas de clé "return", on renvoie juste les données
-                return data
+                # Parsé une seule fois ici, les entités lisent des champs typés
+                self._status = KarotzStatus.from_dict(data) if data else None
+                self._status_body = raw_data if self._status is not None else None
+                return self._status
+        except (aiohttp.ClientConnectionError, TimeoutError) as err:
+            LOGGER.warning("Impossible de joindre le Karotz pour son statut: %s", err)
+            if isinstance(err, TimeoutError):
+                outcome = OUTCOME_TIMEOUT
+            self._breaker_failure()
+            raise ConnectionError(f"Failed to get status: {err}") from err
         except (aiohttp.ClientError, json.JSONDecodeError, ConnectionError) as err:
             LOGGER.warning("Impossible de récupérer le statut du Karotz: %s", err)
             # Re-lever l'erreur pour que le coordinateur la gère comme un échec
             raise ConnectionError(f"Failed to get status: {err}") from err
+        finally:
+            self.metrics.record("status", self._hass.loop.time() - started, outcome)
 
     async def async_set_led(
         self,
@@ -88,9 +442,17 @@ class KarotzApiClient:
             
         return await self._request("leds", params)
 
-    async def async_tts(self, text: str, voice: str = "claire") -> bool:
-        """Send a Text-to-Speech message."""
-        params = {"text": text, "voice": voice, "nocache": "1"}
+    async def async_tts(
+        self, text: str, voice: str = "claire", cache: bool = False, mute: bool = False
+    ) -> bool:
+        """Send a Text-to-Speech message.
+
+        With cache, the rabbit keeps the synthesized audio and reuses it for the
+        same text and voice; with mute, it only synthesizes (to pre-warm it).
+        """
+        params = {"text": text, "voice": voice, "nocache": "0" if cache else "1"}
+        if mute:
+            params["mute"] = "1"
         return await self._request("tts", params)
 
     async def async_play_sound(self, url: str) -> bool:
@@ -103,6 +465,40 @@ class KarotzApiClient:
         params = {"cmd": cmd}
         return await self._request("sound_control", params)
 
+    async def async_is_playing(self) -> bool | None:
+        """Return whether the rabbit is playing a sound, or None if unknown."""
+        if not self.available:
+            return None
+        # Sondes concurrentes : une seule requête
+        return await self._async_enqueue("playback", self._async_probe_playback)
+
+    async def _async_probe_playback(self) -> bool | None:
+        """Probe sound_control with a command the CGI does not act on."""
+        # sound_control vérifie d'abord qu'un lecteur tourne : sans lecteur il
+        # répond "No sound currently playing.", sinon il rejette la commande
+        # inconnue sans rien toucher. On n'envoie donc ni pause ni quit.
+        url = f"{self._base_url}/sound_control"
+        started = self._hass.loop.time()
+        outcome = OUTCOME_ERROR
+        try:
+            async with self._session.get(url, params={"cmd": "status"}, timeout=5) as response:
+                self._breaker_success()
+                response.raise_for_status()
+                data = await response.json(content_type=None)
+            outcome = OUTCOME_SUCCESS
+            return not (isinstance(data, dict) and data.get("msg") == NO_SOUND_PLAYING)
+        except (aiohttp.ClientConnectionError, TimeoutError) as err:
+            LOGGER.debug("Sonde de lecture sans réponse: %s", err)
+            if isinstance(err, TimeoutError):
+                outcome = OUTCOME_TIMEOUT
+            self._breaker_failure()
+            return None
+        except (aiohttp.ClientError, ValueError) as err:
+            LOGGER.debug("Sonde de lecture invalide: %s", err)
+            return None
+        finally:
+            self.metrics.record("playback", self._hass.loop.time() - started, outcome)
+
     async def async_set_ears(self, left: int, right: int) -> bool:
         """Set ear positions."""
         # Note: L'API attend les positions de 0 (bas) à 16 (haut)
@@ -123,6 +519,8 @@ class KarotzApiClient:
 
     async def async_get_snapshot(self) -> bytes | None:
         """Get a camera snapshot."""
+        if not self.available:
+            return None
         url = f"{self._base_url}/snapshot_view?silent=1"
         
         # --- MODIFICATION : En-têtes minimaux pour imiter curl ---
@@ -131,6 +529,8 @@ class KarotzApiClient:
             "Accept-Encoding": "identity" # Demander de ne PAS compresser
         }
         
+        started = self._hass.loop.time()
+        outcome = OUTCOME_ERROR
         try:
             # Ajout de headers=headers
             async with self._session.get(url, timeout=5, headers=headers) as response:
@@ -138,6 +538,7 @@ class KarotzApiClient:
                 data = await response.read()
                 # Si la lecture réussit, on réinitialise le drapeau
                 self._snapshot_error_logged = False
+                outcome = OUTCOME_SUCCESS
                 return data
         except aiohttp.ClientError as err:
             if not self._snapshot_error_logged:
@@ -147,10 +548,56 @@ class KarotzApiClient:
                 LOGGER.debug("Erreur snapshot (déjà signalée): %s", err)
             return None
         except Exception as err:
+            if isinstance(err, TimeoutError):
+                outcome = OUTCOME_TIMEOUT
             if not self._snapshot_error_logged:
                 LOGGER.error("Erreur inattendue snapshot: %s", err)
                 self._snapshot_error_logged = True
             return None
+        finally:
+            self.metrics.record(
+                "snapshot_view", self._hass.loop.time() - started, outcome
+            )
+
+    async def async_get_list(self, endpoint: str) -> list[dict[str, Any]] | None:
+        """Fetch one of the listing CGIs (moods_list, sound_list...)."""
+        if not self.available:
+            return None
+        # Des lectures concurrentes du même catalogue partagent une requête
+        return await self._async_enqueue(
+            endpoint, partial(self._async_fetch_list, endpoint)
+        )
+
+    async def _async_fetch_list(self, endpoint: str) -> list[dict[str, Any]] | None:
+        """Fetch and parse a listing CGI."""
+        url = f"{self._base_url}/{endpoint}"
+        started = self._hass.loop.time()
+        outcome = OUTCOME_ERROR
+        try:
+            async with self._session.get(url, timeout=CATALOG_FETCH_TIMEOUT) as response:
+                self._breaker_success()
+                response.raise_for_status()
+                data = await response.json(content_type=None)
+
+            # La liste est sous une clé qui dépend du CGI ("moods", "sounds"...)
+            if isinstance(data, dict):
+                for value in data.values():
+                    if isinstance(value, list):
+                        outcome = OUTCOME_SUCCESS
+                        return [item for item in value if isinstance(item, dict)]
+            LOGGER.warning("Réponse inattendue de %s: %s", endpoint, data)
+            return None
+        except (aiohttp.ClientConnectionError, TimeoutError) as err:
+            LOGGER.warning("Impossible de lire %s sur le Karotz: %s", endpoint, err)
+            if isinstance(err, TimeoutError):
+                outcome = OUTCOME_TIMEOUT
+            self._breaker_failure()
+            return None
+        except (aiohttp.ClientError, ValueError) as err:
+            LOGGER.warning("Réponse invalide de %s: %s", endpoint, err)
+            return None
+        finally:
+            self.metrics.record(endpoint, self._hass.loop.time() - started, outcome)
 
     async def async_set_volume(self, volume: int) -> bool:
         """Set the volume (0-20)."""
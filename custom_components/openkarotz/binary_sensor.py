@@ -35,7 +35,7 @@ class KarotzSleepSensor(CoordinatorEntity[KarotzCoordinator], BinarySensorEntity
         entry: ConfigEntry
     ):
         """Initialize the binary sensor."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=frozenset({"sleep"}))
         self._entry = entry
         self._attr_unique_id = f"{entry.entry_id}_sleep_status"
 
@@ -52,4 +52,4 @@ class KarotzSleepSensor(CoordinatorEntity[KarotzCoordinator], BinarySensorEntity
         if not self.coordinator.data:
             return False
         # L'API (Doc 2) indique que "1" = endormi, "0" = réveillé
-        return self.coordinator.data.get("sleep") == "1"
\ No newline at end of file
+        return self.coordinator.data.sleep
\ No newline at end of file
@@ -0,0 +1,241 @@
+"""Broadcast service for OpenKarotz: one command sent to many rabbits."""
+from __future__ import annotations
+
+import asyncio
+from functools import partial
+from typing import Any
+
+import voluptuous as vol
+
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+    callback,
+)
+from homeassistant.exceptions import ServiceValidationError
+from homeassistant.helpers import config_validation as cv, device_registry as dr
+
+from .const import (
+    ANNOUNCE_PRIORITIES,
+    BROADCAST_CONCURRENCY,
+    BROADCAST_MAX_START_IN,
+    DOMAIN,
+    LOGGER,
+)
+
+SERVICE_BROADCAST = "broadcast"
+
+# Position des oreilles côté API : 0 (bas) à 16 (haut)
+EAR_POSITION = vol.All(vol.Coerce(int), vol.Range(min=0, max=16))
+
+BROADCAST_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Optional("device_id"): vol.All(cv.ensure_list, [cv.string]),
+            # Un seul contenu audio par diffusion
+            vol.Exclusive("message", "audio"): cv.string,
+            vol.Exclusive("sound_url", "audio"): cv.url,
+            vol.Exclusive("sound_id", "audio"): cv.string,
+            vol.Optional("voice", default="claire"): cv.string,
+            vol.Optional("led_color"): vol.All(
+                vol.Coerce(tuple), vol.ExactSequence((cv.byte, cv.byte, cv.byte))
+            ),
+            vol.Optional("led_pulse", default=False): cv.boolean,
+            vol.Inclusive("ears_left", "ears"): EAR_POSITION,
+            vol.Inclusive("ears_right", "ears"): EAR_POSITION,
+            vol.Optional("priority", default="high"): vol.In(list(ANNOUNCE_PRIORITIES)),
+            vol.Optional("start_in"): vol.All(
+                vol.Coerce(float), vol.Range(min=0, max=BROADCAST_MAX_START_IN)
+            ),
+        }
+    ),
+    cv.has_at_least_one_key("message", "sound_url", "sound_id", "led_color", "ears_left"),
+)
+
+
+@callback
+def _async_targets(hass: HomeAssistant, device_ids: list[str] | None) -> dict[str, str]:
+    """Return the entry ids of the targeted rabbits, mapped to their device id.
+
+    Without device_id, every loaded rabbit is targeted.
+    """
+    registry = dr.async_get(hass)
+    loaded = {
+        entry.entry_id
+        for entry in hass.config_entries.async_entries(DOMAIN)
+        if entry.entry_id in hass.data[DOMAIN]
+    }
+
+    if device_ids is None:
+        targets = {}
+        for entry_id in loaded:
+            device = registry.async_get_device(identifiers={(DOMAIN, entry_id)})
+            targets[entry_id] = device.id if device else entry_id
+        return targets
+
+    targets = {}
+    for device_id in device_ids:
+        device = registry.async_get(device_id)
+        entry_id = next(
+            (
+                identifier
+                for domain, identifier in (device.identifiers if device else ())
+                if domain == DOMAIN
+            ),
+            None,
+        )
+        if entry_id not in loaded:
+            raise ServiceValidationError(f"Karotz inconnu ou non chargé: {device_id}")
+        targets[entry_id] = device_id
+    return targets
+
+
+async def _async_send_audio(
+    hass: HomeAssistant, data: dict[str, Any], params: dict[str, Any]
+) -> str | None:
+    """Queue the audio part of the broadcast on one rabbit."""
+    queue = data["announcements"]
+    priority = params["priority"]
+    if (message := params.get("message")) is not None:
+        return await queue.async_submit(
+            ("tts", message),
+            priority,
+            partial(data["speech"].async_speak, message, params["voice"]),
+            tracks_itself=True,
+        )
+    if (url := params.get("sound_url")) is not None:
+        return await queue.async_submit(
+            ("url", url),
+            priority,
+            partial(data["client"].async_play_sound, url=url),
+            stream=params["sound_stream"],
+            release=hass.data[DOMAIN]["media"].async_pin(url),
+        )
+    if (sound_id := params.get("sound_id")) is not None:
+        return await queue.async_play_sound(sound_id, priority)
+    return None
+
+
+async def _async_broadcast_one(
+    hass: HomeAssistant,
+    entry_id: str,
+    params: dict[str, Any],
+    origin: float,
+    start_at: float | None,
+    semaphore: asyncio.Semaphore,
+) -> dict[str, Any]:
+    """Run the broadcast on one rabbit and return its result.
+
+    The latency is the time from origin (the aligned start time, or the
+    service call) until the rabbit accepted the audio.
+    """
+    data = hass.data[DOMAIN][entry_id]
+    client = data["client"]
+    loop = hass.loop
+    result: dict[str, Any] = {"success": False}
+
+    try:
+        if start_at is not None:
+            # Avant l'heure : synthèse muette du début du message, pour que
+            # tous les lapins parlent dès l'envoi (sans attendre la synthèse)
+            if params.get("message") is not None:
+                async with semaphore:
+                    result["prepared"] = await data["speech"].async_prepare(
+                        params["message"], params["voice"]
+                    )
+            await asyncio.sleep(max(0.0, start_at - loop.time()))
+
+        async with semaphore:
+            success = True
+            # L'audio d'abord : c'est lui qui doit partir en même temps partout
+            if (audio := await _async_send_audio(hass, data, params)) is not None:
+                result["audio"] = audio
+                result["latency"] = round((loop.time() - origin) * 1000)
+                success = audio != "failed"
+
+            if (color := params.get("led_color")) is not None:
+                color_hex = "%02X%02X%02X" % color
+                result["led"] = await client.async_set_led(
+                    color=color_hex, pulse=params["led_pulse"]
+                )
+                if result["led"] and data["coordinator"].data:
+                    data["coordinator"].data.set_led(color_hex, params["led_pulse"])
+                success = success and result["led"]
+
+            if "ears_left" in params:
+                result["ears"] = await client.async_set_ears(
+                    params["ears_left"], params["ears_right"]
+                )
+                success = success and result["ears"]
+
+        result["success"] = success
+    except ConnectionError as err:
+        result["error"] = str(err)
+
+    if "led" in result:
+        hass.async_create_background_task(
+            data["coordinator"].async_request_refresh(), f"{DOMAIN}_broadcast_refresh"
+        )
+    return result
+
+
+async def async_broadcast(hass: HomeAssistant, call: ServiceCall) -> ServiceResponse:
+    """Send the same command to several rabbits at once."""
+    params = dict(call.data)
+    targets = _async_targets(hass, params.get("device_id"))
+    if not targets:
+        raise ServiceValidationError("Aucun Karotz à qui diffuser")
+
+    if (url := params.get("sound_url")) is not None:
+        # Un seul transcodage pour tous les lapins, qui lisent ensuite en local
+        media = hass.data[DOMAIN]["media"]
+        params["sound_url"] = await media.async_get_url(url)
+        # Flux lu tel quel : suivi sans durée maximale
+        params["sound_stream"] = not media.is_local_url(params["sound_url"])
+
+    started = hass.loop.time()
+    start_at = None
+    if (start_in := params.get("start_in")) is not None:
+        start_at = started + start_in
+    origin = start_at if start_at is not None else started
+
+    semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+    results = await asyncio.gather(
+        *(
+            _async_broadcast_one(hass, entry_id, params, origin, start_at, semaphore)
+            for entry_id in targets
+        )
+    )
+
+    devices = dict(zip(targets.values(), results))
+    succeeded = sum(1 for result in results if result["success"])
+    latencies = [
+        result["latency"] for result in results if result["success"] and "latency" in result
+    ]
+    LOGGER.debug(
+        "Diffusion sur %d Karotz en %.2f s : %d réussite(s)",
+        len(targets),
+        hass.loop.time() - started,
+        succeeded,
+    )
+    return {
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        # Écart entre le premier et le dernier lapin à avoir accepté l'audio
+        "spread": max(latencies) - min(latencies) if latencies else None,
+        "devices": devices,
+    }
+
+
+@callback
+def async_register_services(hass: HomeAssistant) -> None:
+    """Register the openkarotz.broadcast service."""
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_BROADCAST,
+        partial(async_broadcast, hass),
+        schema=BROADCAST_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
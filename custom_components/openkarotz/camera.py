@@ -1,12 +1,15 @@
 """Camera platform for OpenKarotz."""
+import asyncio
+
+from aiohttp import web
 from homeassistant.components.camera import Camera, CameraEntityFeature
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
-from .api import KarotzApiClient
-from .const import DOMAIN, LOGGER
+from .const import DOMAIN, LOGGER, MJPEG_KEEPALIVE_INTERVAL
+from .snapshot import KarotzSnapshotCache
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -14,8 +17,8 @@ async def async_setup_entry(
     async_add_entities: AddEntitiesCallback,
 ) -> None:
     """Set up the camera platform."""
-    client: KarotzApiClient = hass.data[DOMAIN][entry.entry_id]["client"]
-    async_add_entities([KarotzCamera(client, entry)])
+    snapshots: KarotzSnapshotCache = hass.data[DOMAIN][entry.entry_id]["snapshots"]
+    async_add_entities([KarotzCamera(snapshots, entry)])
 
 
 class KarotzCamera(Camera):
@@ -23,12 +26,13 @@ class KarotzCamera(Camera):
 
     _attr_has_entity_name = True
     _attr_name = "Caméra"
-    _attr_supported_features = CameraEntityFeature(0) # Pas de streaming
+    # Pas de flux HLS : le direct passe par handle_async_mjpeg_stream
+    _attr_supported_features = CameraEntityFeature(0)
 
-    def __init__(self, client: KarotzApiClient, entry: ConfigEntry) -> None:
+    def __init__(self, snapshots: KarotzSnapshotCache, entry: ConfigEntry) -> None:
         """Initialize the camera."""
         super().__init__()
-        self._client = client
+        self._snapshots = snapshots
         self._entry = entry
         self._attr_unique_id = f"{entry.entry_id}_camera"
 
@@ -39,12 +43,62 @@ class KarotzCamera(Camera):
             identifiers={(DOMAIN, self._entry.entry_id)},
         )
 
+    @property
+    def available(self) -> bool:
+        """Return False while the Karotz circuit breaker is open."""
+        return self._snapshots.client.available
+
+    async def async_added_to_hass(self) -> None:
+        """Follow the circuit breaker state."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            self._snapshots.client.async_add_breaker_listener(
+                lambda _state: self.async_write_ha_state()
+            )
+        )
+
     async def async_camera_image(
         self, width: int | None = None, height: int | None = None
     ) -> bytes | None:
         """Return a snapshot image from the camera."""
         try:
-            return await self._client.async_get_snapshot()
+            # Capture partagée avec les autres spectateurs (et mise en cache)
+            return await self._snapshots.async_get_image(width=width, height=height)
         except Exception as err:
             LOGGER.error("Erreur lors de la récupération du snapshot: %s", err)
-            return None
\ No newline at end of file
+            return None
+
+    async def handle_async_mjpeg_stream(
+        self, request: web.Request
+    ) -> web.StreamResponse | None:
+        """Serve an MJPEG stream fed by the shared capture loop."""
+        response = web.StreamResponse()
+        response.content_type = "multipart/x-mixed-replace;boundary=--frameboundary"
+        await response.prepare(request)
+
+        frames, unsubscribe = self._snapshots.async_subscribe()
+        image: bytes | None = None
+        try:
+            while True:
+                try:
+                    image = await asyncio.wait_for(
+                        frames.get(), MJPEG_KEEPALIVE_INTERVAL
+                    )
+                except TimeoutError:
+                    # Pas de nouvelle image : le spectateur est-il toujours là ?
+                    if request.transport is None or request.transport.is_closing():
+                        break
+                    if image is None:
+                        continue
+                await response.write(
+                    b"--frameboundary\r\nContent-Type: image/jpeg\r\n"
+                    + f"Content-Length: {len(image)}\r\n\r\n".encode()
+                    + image
+                    + b"\r\n"
+                )
+        except ConnectionResetError:
+            LOGGER.debug("Spectateur MJPEG déconnecté")
+        finally:
+            unsubscribe()
+
+        return response
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""Catalog of moods, sounds, radios and RFID tags for OpenKarotz."""
+from __future__ import annotations
+
+import asyncio
+from datetime import timedelta
+from typing import Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import dt as dt_util
+
+from .api import KarotzApiClient
+from .const import (
+    CATALOG_MAX_AGE,
+    CATALOG_RETRY_INTERVAL,
+    CATALOG_STORAGE_VERSION,
+    DOMAIN,
+    LOGGER,
+)
+from .coordinator import KarotzCoordinator
+
+# Catalogue -> CGI de listing
+CATALOG_ENDPOINTS: dict[str, str] = {
+    "moods": "moods_list",
+    "sounds": "sound_list",
+    "radios": "radios_list",
+    "tags": "rfid_list",
+}
+
+# Catalogue -> compteur de /status qui signale un changement (pas de compteur
+# pour les radios, relues seulement avec CATALOG_MAX_AGE)
+CATALOG_COUNTS: dict[str, str] = {
+    "moods": "nb_moods",
+    "sounds": "nb_sounds",
+    "tags": "nb_tags",
+}
+
+
+def _normalize(items: list[dict[str, Any]]) -> list[dict[str, str]]:
+    """Keep the id and a display name of each catalog item."""
+    catalog = []
+    for item in items:
+        if item.get("id") is None:
+            continue
+        item_id = str(item["id"])
+        name = item.get("name") or item.get("text") or item_id
+        catalog.append({"id": item_id, "name": str(name)})
+    return catalog
+
+
+class KarotzCatalogCoordinator(DataUpdateCoordinator[dict[str, list[dict[str, str]]]]):
+    """Keeps the device catalogs, persisted and revalidated on count changes.
+
+    A refresh happens when the nb_* counters of the status coordinator differ
+    from those of the stored catalogs, or once the catalogs are older than
+    CATALOG_MAX_AGE seconds (radios have no counter), and is retried every
+    CATALOG_RETRY_INTERVAL seconds while it fails.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        client: KarotzApiClient,
+        status_coordinator: KarotzCoordinator,
+        entry_id: str,
+    ) -> None:
+        """Initialize the catalog coordinator."""
+        self.client = client
+        self._status_coordinator = status_coordinator
+        self._store: Store[dict[str, Any]] = Store(
+            hass, CATALOG_STORAGE_VERSION, f"{DOMAIN}.catalog.{entry_id}"
+        )
+        # Compteurs de /status au moment où les catalogues ont été lus
+        self._counts: dict[str, int | None] | None = None
+        # Date (timestamp) de la dernière lecture complète
+        self._fetched_at: float | None = None
+        super().__init__(
+            hass,
+            LOGGER,
+            name=f"{DOMAIN}_catalog",
+            update_interval=None,
+            always_update=False,
+        )
+
+    async def async_load(self) -> None:
+        """Restore the catalogs from disk, without touching the device."""
+        stored = await self._store.async_load()
+        if stored:
+            self._counts = stored.get("counts")
+            self._fetched_at = stored.get("fetched_at")
+            self.async_set_updated_data(stored.get("catalogs", {}))
+            if not self._async_expired():
+                # Relecture quand les catalogues auront CATALOG_MAX_AGE s
+                self.update_interval = timedelta(
+                    seconds=self._fetched_at + CATALOG_MAX_AGE - dt_util.utcnow().timestamp()
+                )
+        else:
+            self.async_set_updated_data({name: [] for name in CATALOG_ENDPOINTS})
+
+    @callback
+    def async_start(self) -> CALLBACK_TYPE:
+        """Watch the status counters; return a callback to stop watching."""
+        self._async_status_updated()
+        return self._status_coordinator.async_add_listener(
+            self._async_status_updated, frozenset(CATALOG_COUNTS.values())
+        )
+
+    @callback
+    def _async_current_counts(self) -> dict[str, int | None] | None:
+        """Return the catalog counters from the latest status."""
+        status = self._status_coordinator.data
+        if status is None:
+            return None
+        return {key: getattr(status, key) for key in CATALOG_COUNTS.values()}
+
+    @callback
+    def _async_expired(self) -> bool:
+        """Return True if the catalogs are older than CATALOG_MAX_AGE."""
+        return (
+            self._fetched_at is None
+            or dt_util.utcnow().timestamp() - self._fetched_at >= CATALOG_MAX_AGE
+        )
+
+    @callback
+    def _async_status_updated(self) -> None:
+        """Revalidate the catalogs in the background when a counter changed."""
+        counts = self._async_current_counts()
+        if counts is None or (counts == self._counts and not self._async_expired()):
+            return
+        LOGGER.debug(
+            "Compteurs du catalogue modifiés (%s) ou catalogue ancien, relecture", counts
+        )
+        self.hass.async_create_background_task(
+            self.async_request_refresh(), f"{DOMAIN}_catalog_refresh"
+        )
+
+    async def _async_update_data(self) -> dict[str, list[dict[str, str]]]:
+        """Fetch every catalog and persist the result."""
+        counts = self._async_current_counts()
+        names = list(CATALOG_ENDPOINTS)
+        results = await asyncio.gather(
+            *(self.client.async_get_list(CATALOG_ENDPOINTS[name]) for name in names)
+        )
+
+        catalogs = dict(self.data or {})
+        failed = []
+        for name, items in zip(names, results):
+            if items is None:
+                failed.append(name)
+            else:
+                catalogs[name] = _normalize(items)
+
+        if failed:
+            # On garde les anciens catalogues et on réessaie plus tard
+            self.update_interval = timedelta(seconds=CATALOG_RETRY_INTERVAL)
+            raise UpdateFailed(f"Failed to read catalogs: {', '.join(failed)}")
+
+        # Prochaine relecture au plus tard dans CATALOG_MAX_AGE s (radios)
+        self.update_interval = timedelta(seconds=CATALOG_MAX_AGE)
+        self._counts = counts
+        self._fetched_at = dt_util.utcnow().timestamp()
+        await self._store.async_save(
+            {"counts": counts, "fetched_at": self._fetched_at, "catalogs": catalogs}
+        )
+        return catalogs
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the catalog sizes, for diagnostics."""
+        return {
+            "counts": self._counts,
+            "fetched_at": self._fetched_at,
+            "sizes": {name: len(items) for name, items in (self.data or {}).items()},
+        }
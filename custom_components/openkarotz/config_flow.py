@@ -1,16 +1,38 @@
 """Config flow for OpenKarotz."""
+import ipaddress
 import logging
 from typing import Any
 import aiohttp
 import voluptuous as vol
 import json # <-- ASSUREZ-VOUS QUE CET IMPORT EST PRÉSENT
 
-from homeassistant.config_entries import ConfigFlow, ConfigFlowResult
+from homeassistant.config_entries import (
+    ConfigEntry,
+    ConfigFlow,
+    ConfigFlowResult,
+    OptionsFlow,
+)
+from homeassistant.components import network
 from homeassistant.const import CONF_HOST, CONF_NAME
+from homeassistant.core import callback
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.helpers import selector
 
-from .const import DOMAIN, LOGGER
+from .const import (
+    CONF_DEDICATED_SESSION,
+    CONF_RFID_HOLDOFF,
+    CONF_SNAPSHOT_TTL,
+    CONF_SUBNET,
+    CONF_TTS_CACHE,
+    DEFAULT_DEDICATED_SESSION,
+    DEFAULT_RFID_HOLDOFF,
+    DEFAULT_SNAPSHOT_TTL,
+    DEFAULT_TTS_CACHE,
+    DEFAULT_SUBNET,
+    DOMAIN,
+    LOGGER,
+)
+from .discovery import KarotzDiscoveryResult, async_discover, subnet_hosts
 
 DATA_SCHEMA = vol.Schema(
     {
@@ -24,6 +46,16 @@ class OpenKarotzConfigFlow(ConfigFlow, domain=DOMAIN):
 
     VERSION = 1
 
+    def __init__(self) -> None:
+        """Initialize the config flow."""
+        self._discovered: list[KarotzDiscoveryResult] = []
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: ConfigEntry) -> OptionsFlow:
+        """Create the options flow."""
+        return OpenKarotzOptionsFlow(config_entry)
+
     async def _test_connection(self, host: str) -> bool:
         """Test connection to the Karotz device using /cgi-bin/status."""
         session = async_get_clientsession(self.hass)
@@ -60,7 +92,85 @@ class OpenKarotzConfigFlow(ConfigFlow, domain=DOMAIN):
     async def async_step_user(
         self, user_input: dict[str, Any] | None = None
     ) -> ConfigFlowResult:
-        """Handle the initial step."""
+        """Handle the initial step: scan the network or enter an address."""
+        return self.async_show_menu(step_id="user", menu_options=["scan", "manual"])
+
+    async def _async_default_subnet(self) -> str:
+        """Return the /24 of the address Home Assistant uses on the LAN."""
+        try:
+            source_ip = await network.async_get_source_ip(self.hass)
+            return str(ipaddress.ip_network(f"{source_ip}/24", strict=False))
+        except (OSError, ValueError):
+            return DEFAULT_SUBNET
+
+    async def async_step_scan(
+        self, user_input: dict[str, Any] | None = None
+    ) -> ConfigFlowResult:
+        """Probe a subnet for rabbits."""
+        errors: dict[str, str] = {}
+
+        if user_input is not None:
+            try:
+                hosts = subnet_hosts(user_input[CONF_SUBNET])
+            except ValueError:
+                errors[CONF_SUBNET] = "invalid_subnet"
+            else:
+                # Les lapins déjà configurés (ID unique = IP) ne sont pas sondés
+                self._discovered = await async_discover(
+                    hosts, skip=self._async_current_ids()
+                )
+                if self._discovered:
+                    return await self.async_step_pick()
+                errors["base"] = "no_devices_found"
+
+        subnet = (
+            user_input[CONF_SUBNET]
+            if user_input is not None
+            else await self._async_default_subnet()
+        )
+        return self.async_show_form(
+            step_id="scan",
+            data_schema=vol.Schema(
+                {vol.Required(CONF_SUBNET, default=subnet): selector.TextSelector()}
+            ),
+            errors=errors,
+        )
+
+    async def async_step_pick(
+        self, user_input: dict[str, Any] | None = None
+    ) -> ConfigFlowResult:
+        """Pick one of the discovered rabbits."""
+        if user_input is not None:
+            host = user_input[CONF_HOST]
+            await self.async_set_unique_id(host)
+            self._abort_if_unique_id_configured()
+            return self.async_create_entry(title=user_input[CONF_NAME], data=user_input)
+
+        return self.async_show_form(
+            step_id="pick",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(
+                        CONF_HOST, default=self._discovered[0].host
+                    ): selector.SelectSelector(
+                        selector.SelectSelectorConfig(
+                            options=[
+                                selector.SelectOptionDict(
+                                    value=result.host, label=result.label
+                                )
+                                for result in self._discovered
+                            ]
+                        )
+                    ),
+                    vol.Required(CONF_NAME, default="Karotz"): selector.TextSelector(),
+                }
+            ),
+        )
+
+    async def async_step_manual(
+        self, user_input: dict[str, Any] | None = None
+    ) -> ConfigFlowResult:
+        """Enter the address of the rabbit."""
         errors: dict[str, str] = {}
 
         if user_input is not None:
@@ -82,7 +192,65 @@ class OpenKarotzConfigFlow(ConfigFlow, domain=DOMAIN):
 
         # Afficher le formulaire
         return self.async_show_form(
-            step_id="user",
+            step_id="manual",
             data_schema=DATA_SCHEMA,
             errors=errors,
-        )
\ No newline at end of file
+        )
+
+
+class OpenKarotzOptionsFlow(OptionsFlow):
+    """Handle OpenKarotz options."""
+
+    def __init__(self, config_entry: ConfigEntry) -> None:
+        """Initialize the options flow."""
+        self._entry = config_entry
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> ConfigFlowResult:
+        """Manage the options."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        options = self._entry.options
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(
+                        CONF_DEDICATED_SESSION,
+                        default=options.get(
+                            CONF_DEDICATED_SESSION, DEFAULT_DEDICATED_SESSION
+                        ),
+                    ): selector.BooleanSelector(),
+                    vol.Required(
+                        CONF_RFID_HOLDOFF,
+                        default=options.get(CONF_RFID_HOLDOFF, DEFAULT_RFID_HOLDOFF),
+                    ): selector.NumberSelector(
+                        selector.NumberSelectorConfig(
+                            min=0,
+                            max=60,
+                            step=0.5,
+                            unit_of_measurement="s",
+                            mode=selector.NumberSelectorMode.BOX,
+                        )
+                    ),
+                    vol.Required(
+                        CONF_SNAPSHOT_TTL,
+                        default=options.get(CONF_SNAPSHOT_TTL, DEFAULT_SNAPSHOT_TTL),
+                    ): selector.NumberSelector(
+                        selector.NumberSelectorConfig(
+                            min=0,
+                            max=60,
+                            step=0.5,
+                            unit_of_measurement="s",
+                            mode=selector.NumberSelectorMode.BOX,
+                        )
+                    ),
+                    vol.Required(
+                        CONF_TTS_CACHE,
+                        default=options.get(CONF_TTS_CACHE, DEFAULT_TTS_CACHE),
+                    ): selector.BooleanSelector(),
+                }
+            ),
+        )
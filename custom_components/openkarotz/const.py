@@ -7,4 +7,165 @@ LOGGER = logging.getLogger(__package__)
 
 # Intervalle de polling pour le coordinateur (basé sur Doc 2)
 # 30 secondes est un bon compromis
-COORDINATOR_POLL_INTERVAL: Final = 30
\ No newline at end of file
+COORDINATOR_POLL_INTERVAL: Final = 30
+
+# Polling adaptatif : rafraîchissement rapide juste après une commande ou un
+# événement webhook, puis recul exponentiel quand le lapin dort ou que son
+# statut ne change plus (chaque appel à /cgi-bin/status lance un script CGI).
+POLL_FAST_INTERVAL: Final = 5
+POLL_FAST_WINDOW: Final = 60
+POLL_MAX_INTERVAL: Final = 300
+POLL_IDLE_THRESHOLD: Final = 3
+
+# Options de l'entrée de configuration. La session partagée de Home Assistant
+# garde déjà les connexions ouvertes : le pool dédié (un connecteur par lapin)
+# reste une option, pour les flottes où la session partagée sature.
+CONF_DEDICATED_SESSION: Final = "dedicated_session"
+DEFAULT_DEDICATED_SESSION: Final = False
+CONF_RFID_HOLDOFF: Final = "rfid_holdoff"
+DEFAULT_RFID_HOLDOFF: Final = 3.0
+CONF_SNAPSHOT_TTL: Final = "snapshot_ttl"
+DEFAULT_SNAPSHOT_TTL: Final = 2.0
+CONF_TTS_CACHE: Final = "tts_cache"
+DEFAULT_TTS_CACHE: Final = True
+
+# Sous-réseau à scanner dans l'étape de découverte
+CONF_SUBNET: Final = "subnet"
+DEFAULT_SUBNET: Final = "192.168.1.0/24"
+
+# Pool de connexions dédié à un lapin. lighttpd ferme les connexions inactives
+# après 5 s (server.max-keep-alive-idle) : on les abandonne juste avant.
+SESSION_CONNECTION_LIMIT: Final = 2
+SESSION_KEEPALIVE_TIMEOUT: Final = 4
+SESSION_DNS_CACHE_TTL: Final = 300
+
+# Répartition des polls d'une flotte de lapins : chaque coordinateur reçoit un
+# créneau dans l'intervalle de base (avec un peu de gigue) et le nombre de
+# lectures de statut simultanées est plafonné pour tout le domaine.
+FLEET_MAX_CONCURRENT_POLLS: Final = 4
+FLEET_POLL_JITTER: Final = 0.1
+
+# Nombre maximal d'événements acceptés dans un même POST du webhook
+WEBHOOK_MAX_BATCH: Final = 100
+
+# Anti-rebond des événements webhook : un tag posé sur le lecteur ou un curl
+# rejoué renvoie le même événement. Les boutons gardent une fenêtre courte,
+# fixe depuis le premier clic, pour ne pas avaler de vrais clics successifs.
+BUTTON_EVENT_HOLDOFF: Final = 0.5
+EVENT_ID_TTL: Final = 60
+EVENT_DEDUP_MAX_ENTRIES: Final = 64
+
+# Flux MJPEG : une seule boucle de capture par lapin, dont la cadence suit la
+# latence mesurée de snapshot_view (lissée), bornée entre ces deux valeurs.
+MJPEG_MIN_FRAME_INTERVAL: Final = 0.5
+MJPEG_MAX_FRAME_INTERVAL: Final = 10.0
+MJPEG_LATENCY_FACTOR: Final = 2.0
+# Captures ratées d'affilée : l'attente double jusqu'à MJPEG_MAX_RETRY_INTERVAL.
+# Sans image pendant MJPEG_KEEPALIVE_INTERVAL, la dernière est renvoyée au
+# spectateur, ce qui détecte aussi sa déconnexion.
+MJPEG_MAX_RETRY_INTERVAL: Final = 60.0
+MJPEG_KEEPALIVE_INTERVAL: Final = 15.0
+
+# Nombre de tailles de vignettes gardées pour la dernière capture
+SNAPSHOT_MAX_RESIZED: Final = 4
+
+# Disjoncteur : après quelques échecs de connexion consécutifs, les commandes
+# sont refusées immédiatement au lieu d'attendre chacune leur timeout. Un seul
+# appel à /status est retenté après le délai de réarmement.
+BREAKER_CLOSED: Final = "closed"
+BREAKER_OPEN: Final = "open"
+BREAKER_HALF_OPEN: Final = "half_open"
+BREAKER_FAILURE_THRESHOLD: Final = 2
+BREAKER_RESET_TIMEOUT: Final = 30
+
+# Catalogues du lapin (humeurs, sons, radios, tags RFID) : les CGI de listing
+# sont lents, on garde leur résultat sur disque et on ne les rappelle que
+# quand les compteurs de /status changent (ou pour réessayer après un échec).
+# Les radios n'ont pas de compteur : tout est relu au plus tard après
+# CATALOG_MAX_AGE s.
+CATALOG_STORAGE_VERSION: Final = 1
+CATALOG_RETRY_INTERVAL: Final = 300
+CATALOG_MAX_AGE: Final = 86400
+CATALOG_FETCH_TIMEOUT: Final = 30
+
+# Dernier statut connu, gardé sur disque pour démarrer sans attendre le lapin.
+# Les écritures sont regroupées : au plus une toutes les STATUS_SAVE_DELAY s.
+STATUS_STORAGE_VERSION: Final = 1
+STATUS_SAVE_DELAY: Final = 30
+
+# Découverte sur le réseau local : les hôtes d'un sous-réseau sont sondés en
+# parallèle sur /cgi-bin/status, avec des délais courts (un /24 en quelques
+# secondes). Au-delà de DISCOVERY_MAX_HOSTS adresses, le scan est refusé.
+DISCOVERY_CONCURRENCY: Final = 64
+DISCOVERY_CONNECT_TIMEOUT: Final = 0.75
+DISCOVERY_TIMEOUT: Final = 2.0
+DISCOVERY_MAX_HOSTS: Final = 1024
+
+# Suivi de lecture : tant qu'un son, un TTS ou une radio est en cours, on sonde
+# sound_control toutes les PLAYBACK_POLL_INTERVAL s (aucune requête sinon).
+# Pendant PLAYBACK_START_GRACE s, "rien en cours" est ignoré (synthèse TTS ou
+# téléchargement pas encore terminés). Au-delà de PLAYBACK_MAX_DURATION s, la
+# lecture est considérée comme finie, sauf pour une radio ou un flux, suivis
+# jusqu'à ce que le lapin ne joue plus rien. Passé PLAYBACK_SLOW_AFTER s,
+# l'intervalle double à chaque sonde jusqu'à PLAYBACK_MAX_POLL_INTERVAL s.
+NO_SOUND_PLAYING: Final = "No sound currently playing."
+PLAYBACK_POLL_INTERVAL: Final = 1.0
+PLAYBACK_START_GRACE: Final = 5.0
+PLAYBACK_MAX_DURATION: Final = 900
+PLAYBACK_SLOW_AFTER: Final = 10.0
+PLAYBACK_MAX_POLL_INTERVAL: Final = 15.0
+
+# Découpage des TTS longs : le premier morceau est court pour que le lapin
+# commence à parler vite, les suivants sont envoyés à la fin du précédent.
+TTS_FIRST_CHUNK_MAX_CHARS: Final = 80
+TTS_CHUNK_MAX_CHARS: Final = 200
+
+# Cache TTS du lapin (nocache=0) : seules les phrases déjà dites
+# TTS_CACHE_MIN_USES fois y sont mises. L'index LRU côté Home Assistant suit
+# les TTS_CACHE_MAX_ENTRIES phrases les plus récentes, et plus rien n'est mis
+# en cache quand il reste moins de TTS_CACHE_MIN_FREE_SPACE octets sur le lapin.
+TTS_CACHE_STORAGE_VERSION: Final = 1
+TTS_CACHE_MAX_ENTRIES: Final = 200
+TTS_CACHE_MIN_USES: Final = 2
+TTS_CACHE_MIN_FREE_SPACE: Final = 20 * 1024 * 1024
+TTS_CACHE_SAVE_DELAY: Final = 60
+# Pause entre deux phrases pré-chauffées, pour laisser passer les commandes
+TTS_PREWARM_PAUSE: Final = 2.0
+
+# File d'annonces : une seule lecture à la fois par lapin, la plus prioritaire
+# d'abord. Une annonce plus prioritaire que celle en cours l'interrompt (une
+# alarme coupe la radio). Une annonce qui attend depuis plus de
+# ANNOUNCE_MAX_AGE s n'est plus d'actualité et est abandonnée.
+ANNOUNCE_PRIORITIES: Final = {"low": 0, "normal": 1, "high": 2, "alarm": 3}
+ANNOUNCE_DEFAULT_PRIORITY: Final = "normal"
+# La radio est un fond sonore : toute annonce passe devant
+ANNOUNCE_RADIO_PRIORITY: Final = "low"
+ANNOUNCE_MAX_AGE: Final = 120
+
+# Diffusion (openkarotz.broadcast) : au plus BROADCAST_CONCURRENCY lapins sont
+# commandés en même temps. Avec un départ aligné (start_in, au plus
+# BROADCAST_MAX_START_IN s), le début du message est synthétisé en silence
+# avant l'heure pour que tous les lapins parlent dans la même seconde.
+BROADCAST_CONCURRENCY: Final = 16
+BROADCAST_MAX_START_IN: Final = 30
+
+# Proxy audio : les médias sont transcodés une fois (ffmpeg, au plus
+# MEDIA_TRANSCODE_CONCURRENCY à la fois) en MP3 mono à bas débit, que le lapin
+# décode sans peine, puis servis par Home Assistant sur le réseau local. Le
+# cache sur disque est limité à MEDIA_CACHE_MAX_SIZE octets (LRU). Un média
+# dont le transcodage dépasse MEDIA_TRANSCODE_TIMEOUT s (flux en direct ?) est
+# donné tel quel au lapin.
+MEDIA_CACHE_DIR: Final = "openkarotz_media"
+MEDIA_CACHE_STORAGE_VERSION: Final = 1
+MEDIA_CACHE_MAX_SIZE: Final = 200 * 1024 * 1024
+MEDIA_TRANSCODE_CONCURRENCY: Final = 2
+MEDIA_TRANSCODE_TIMEOUT: Final = 30
+MEDIA_BITRATE: Final = "48k"
+MEDIA_SAMPLE_RATE: Final = 22050
+# Les flux (listes de lecture, en-têtes icy-) sont repérés par une requête
+# dont seuls les en-têtes sont lus, et mémorisés, au plus
+# MEDIA_DIRECT_MAX_ENTRIES. Un média dont le transcodage a échoué est lu tel
+# quel pendant MEDIA_FAILURE_RETRY s, puis retranscodé.
+MEDIA_PROBE_TIMEOUT: Final = 5
+MEDIA_DIRECT_MAX_ENTRIES: Final = 500
+MEDIA_FAILURE_RETRY: Final = 3600
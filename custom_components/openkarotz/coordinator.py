@@ -2,42 +2,189 @@
 from datetime import timedelta
 from typing import Any
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 
-from .api import KarotzApiClient
-from .const import DOMAIN, LOGGER, COORDINATOR_POLL_INTERVAL
+from .api import KarotzApiClient, KarotzCircuitOpenError
+from .models import KarotzStatus
+from .scheduler import KarotzPollScheduler
+from .const import (
+    BREAKER_OPEN,
+    DOMAIN,
+    LOGGER,
+    COORDINATOR_POLL_INTERVAL,
+    POLL_FAST_INTERVAL,
+    POLL_FAST_WINDOW,
+    POLL_IDLE_THRESHOLD,
+    POLL_MAX_INTERVAL,
+    STATUS_SAVE_DELAY,
+    STATUS_STORAGE_VERSION,
+)
 
-class KarotzCoordinator(DataUpdateCoordinator[dict[str, Any]]):
-    """Manages polling for Karotz status data."""
+class KarotzCoordinator(DataUpdateCoordinator[KarotzStatus]):
+    """Manages polling for Karotz status data.
 
-    def __init__(self, hass: HomeAssistant, client: KarotzApiClient) -> None:
+    Entities pass the frozenset of status fields they read as their coordinator
+    context; they are only notified when one of those fields changes.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        client: KarotzApiClient,
+        scheduler: KarotzPollScheduler,
+        entry_id: str,
+    ) -> None:
         """Initialize the data update coordinator."""
         self.client = client
+        self._scheduler = scheduler
+        self._entry_id = entry_id
+        # Dernier statut connu, restauré au démarrage
+        self._store: Store[dict[str, Any]] = Store(
+            hass, STATUS_STORAGE_VERSION, f"{DOMAIN}.status.{entry_id}"
+        )
         super().__init__(
             hass,
             LOGGER,
             name=DOMAIN,
             update_interval=timedelta(seconds=COORDINATOR_POLL_INTERVAL),
+            # Un poll identique au précédent ne notifie personne
+            always_update=False,
         )
+        # Statut affiché par les entités avant le poll (pour le diff par clé) :
+        # c'est l'objet courant lui-même, avec les écritures optimistes
+        self._previous_data: KarotzStatus | None = None
+        self._notified_success = True
+        # État du polling adaptatif
+        self._fast_poll_until = 0.0
+        self._last_status: KarotzStatus | None = None
+        self._unchanged_polls = 0
+        self._backoff_level = 0
+
+        # Chaque commande envoyée au lapin relance le polling rapide
+        client.async_add_action_listener(self.async_note_activity)
+        # Disjoncteur ouvert : les entités passent indisponibles sans attendre
+        client.async_add_breaker_listener(self._async_breaker_changed)
+
+    async def async_restore(self) -> bool:
+        """Load the last known status from disk; return True if there was one."""
+        stored = await self._store.async_load()
+        if not stored:
+            return False
+        self.data = KarotzStatus.from_dict(stored)
+        LOGGER.debug("Dernier statut connu restauré: %s", self.data)
+        return True
+
+    @callback
+    def _async_breaker_changed(self, state: str) -> None:
+        """Mark the data as failed as soon as the circuit breaker opens."""
+        if state == BREAKER_OPEN:
+            self.async_set_update_error(
+                KarotzCircuitOpenError("Karotz unreachable (circuit open)")
+            )
+
+    @callback
+    def async_note_activity(self) -> None:
+        """Switch to fast polling after a command or a webhook event."""
+        self._fast_poll_until = self.hass.loop.time() + POLL_FAST_WINDOW
+        self._unchanged_polls = 0
+        self._backoff_level = 0
+
+        fast_interval = timedelta(seconds=POLL_FAST_INTERVAL)
+        if self.update_interval != fast_interval:
+            LOGGER.debug("Activité détectée, passage au polling rapide")
+            self.update_interval = fast_interval
+            # Sans entité à l'écoute, il n'y a pas de polling à relancer
+            if self._listeners:
+                self._schedule_refresh()
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Notify only the listeners subscribed to status keys that changed."""
+        data = self.data
+        previous = self._previous_data
+        self._previous_data = data
 
-    async def _async_update_data(self) -> dict[str, Any]:
+        if (
+            data is None
+            or previous is None
+            or self.last_update_success != self._notified_success
+        ):
+            # Premier statut ou changement de disponibilité : tout le monde
+            changed = None
+        else:
+            changed = data.changed_fields(previous)
+        self._notified_success = self.last_update_success
+
+        for update_callback, context in list(self._listeners.values()):
+            if (
+                changed is None
+                or not isinstance(context, frozenset)
+                or not context.isdisjoint(changed)
+            ):
+                update_callback()
+
+    @callback
+    def _async_adapt_interval(self, data: KarotzStatus) -> None:
+        """Compute the next polling interval from device state and activity."""
+        if data == self._last_status:
+            self._unchanged_polls += 1
+        else:
+            self._unchanged_polls = 0
+        self._last_status = data
+
+        if self.hass.loop.time() < self._fast_poll_until:
+            interval = POLL_FAST_INTERVAL
+        elif data.sleep or self._unchanged_polls >= POLL_IDLE_THRESHOLD:
+            # Lapin endormi ou inactif : on double l'intervalle à chaque poll
+            if COORDINATOR_POLL_INTERVAL * 2 ** self._backoff_level < POLL_MAX_INTERVAL:
+                self._backoff_level += 1
+            interval = min(
+                COORDINATOR_POLL_INTERVAL * 2 ** self._backoff_level,
+                POLL_MAX_INTERVAL,
+            )
+        else:
+            self._backoff_level = 0
+            interval = COORDINATOR_POLL_INTERVAL
+
+        # Caler le prochain poll sur le créneau attribué à ce lapin
+        interval = self._scheduler.async_align(self._entry_id, interval)
+
+        if self.update_interval != timedelta(seconds=interval):
+            LOGGER.debug("Intervalle de polling ajusté à %.1f s", interval)
+            self.update_interval = timedelta(seconds=interval)
+
+    async def _async_update_data(self) -> KarotzStatus:
         """
         Fetch data from /cgi-bin/status.
         C'est l'implémentation de l'idée clé du Doc 2.
         """
+        # Les entités écrivent leurs valeurs optimistes dans self.data : le
+        # diff doit se faire contre ce qu'elles affichent, pas contre le
+        # dernier statut notifié (sinon un retour à cette valeur passe inaperçu)
+        self._previous_data = self.data
         try:
-            data = await self.client.async_get_status()
+            # Le créneau de la flotte n'est pris que pendant la requête HTTP,
+            # pas pendant l'attente derrière les commandes de ce lapin
+            data = await self.client.async_get_status(self._scheduler.async_poll_slot)
             if data:
-                LOGGER.debug("Données du coordinateur mises à jour: %s", data)
+                if data is not self.data:
+                    LOGGER.debug("Données du coordinateur mises à jour: %s", data)
+                    if data != self.data:
+                        self._store.async_delay_save(lambda: data.raw, STATUS_SAVE_DELAY)
+                self._async_adapt_interval(data)
                 return data
-            
+
             LOGGER.debug("Le Karotz a retourné une réponse vide depuis /status")
             raise UpdateFailed("Le Karotz a retourné une réponse vide depuis /status")
 
+        except KarotzCircuitOpenError as err:
+            # Déjà signalé par le client, inutile de répéter à chaque poll
+            raise UpdateFailed(f"Connection error: {err}") from err
         except ConnectionError as err:
             LOGGER.error("Échec de la connexion lors de la mise à jour du coordinateur: %s", err)
             raise UpdateFailed(f"Connection error: {err}") from err
         except Exception as err:
             LOGGER.error("Erreur inattendue lors de la mise à jour du coordinateur: %s", err)
-            raise UpdateFailed(f"Unexpected error: {err}") from err
\ No newline at end of file
+            raise UpdateFailed(f"Unexpected error: {err}") from err
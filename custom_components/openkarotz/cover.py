@@ -57,6 +57,20 @@ class KarotzEars(CoverEntity):
             identifiers={(DOMAIN, self._entry.entry_id)},
         )
 
+    @property
+    def available(self) -> bool:
+        """Return False while the Karotz circuit breaker is open."""
+        return self._client.available
+
+    async def async_added_to_hass(self) -> None:
+        """Follow the circuit breaker state."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            self._client.async_add_breaker_listener(
+                lambda _state: self.async_write_ha_state()
+            )
+        )
+
     def _ha_to_karotz_pos(self, ha_pos: int) -> int:
         """Convert HA position (0-100) to Karotz position (0-16)."""
         percentage = ha_pos / 100
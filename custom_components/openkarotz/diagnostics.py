@@ -0,0 +1,37 @@
+"""Diagnostics support for OpenKarotz."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+
+TO_REDACT = {"wlan_mac", "eth_mac"}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    data = hass.data[DOMAIN][entry.entry_id]
+    coordinator = data["coordinator"]
+
+    return {
+        "circuit_breaker": data["client"].breaker_state,
+        "status": async_redact_data(
+            coordinator.data.raw if coordinator.data else {}, TO_REDACT
+        ),
+        "status_polls": data["client"].status_stats,
+        "polling": hass.data[DOMAIN]["scheduler"].async_get_schedule(),
+        "snapshots": data["snapshots"].as_dict(),
+        "catalog": data["catalog"].as_dict(),
+        "playback": data["playback"].as_dict(),
+        "speech": data["speech"].as_dict(),
+        "announcements": data["announcements"].as_dict(),
+        "media_cache": hass.data[DOMAIN]["media"].as_dict(),
+        "endpoint_metrics": data["client"].metrics.as_dict(),
+        "webhook_dedup": hass.data[DOMAIN]["webhooks"][data["webhook_id"]].dedup.as_dict(),
+    }
@@ -0,0 +1,148 @@
+"""LAN discovery of OpenKarotz rabbits."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Iterable
+import ipaddress
+import json
+import re
+
+import aiohttp
+
+from .const import (
+    DISCOVERY_CONCURRENCY,
+    DISCOVERY_CONNECT_TIMEOUT,
+    DISCOVERY_MAX_HOSTS,
+    DISCOVERY_TIMEOUT,
+    LOGGER,
+)
+
+
+class KarotzDiscoveryResult:
+    """A host that answered /cgi-bin/status like a Karotz."""
+
+    __slots__ = ("host", "version", "wlan_mac")
+
+    def __init__(self, host: str, version: str | None, wlan_mac: str | None) -> None:
+        """Initialize the result."""
+        self.host = host
+        self.version = version
+        self.wlan_mac = wlan_mac
+
+    @property
+    def label(self) -> str:
+        """Return a label for the config flow."""
+        details = ", ".join(
+            part
+            for part in (
+                f"v{self.version}" if self.version else None,
+                self.wlan_mac,
+            )
+            if part
+        )
+        return f"{self.host} ({details})" if details else self.host
+
+    def __repr__(self) -> str:
+        """Return a readable representation."""
+        return f"KarotzDiscoveryResult({self.host!r}, {self.version!r}, {self.wlan_mac!r})"
+
+
+def subnet_hosts(subnet: str) -> list[str]:
+    """Return the host addresses of a subnet such as "192.168.1.0/24".
+
+    Raises ValueError if the subnet is invalid or too large to scan.
+    """
+    network = ipaddress.ip_network(subnet, strict=False)
+    if network.num_addresses > DISCOVERY_MAX_HOSTS + 2:
+        raise ValueError(f"Subnet {subnet} is too large to scan")
+    return [str(address) for address in network.hosts()]
+
+
+def _version_key(version: str | None) -> tuple[int, ...]:
+    """Turn a firmware version into a sortable tuple."""
+    return tuple(int(part) for part in re.findall(r"\d+", version or ""))
+
+
+def rank_results(results: Iterable[KarotzDiscoveryResult]) -> list[KarotzDiscoveryResult]:
+    """Drop duplicate rabbits and sort the most likely ones first.
+
+    Real rabbits report a wlan_mac; a rabbit seen on two addresses (Wi-Fi and
+    Ethernet) is kept once. Newer firmware comes first, then the address.
+    """
+    by_mac: dict[str, KarotzDiscoveryResult] = {}
+    unique: list[KarotzDiscoveryResult] = []
+    for result in results:
+        if result.wlan_mac:
+            if result.wlan_mac in by_mac:
+                continue
+            by_mac[result.wlan_mac] = result
+        unique.append(result)
+
+    def sort_key(result: KarotzDiscoveryResult) -> tuple:
+        try:
+            address: tuple = (0, int(ipaddress.ip_address(result.host.split(":")[0])))
+        except ValueError:
+            address = (1, result.host)
+        return (
+            result.wlan_mac is None,
+            tuple(-part for part in _version_key(result.version)),
+            address,
+        )
+
+    return sorted(unique, key=sort_key)
+
+
+async def _async_probe(
+    session: aiohttp.ClientSession, host: str, semaphore: asyncio.Semaphore
+) -> KarotzDiscoveryResult | None:
+    """Probe one host; return a result if it answers like a Karotz."""
+    async with semaphore:
+        try:
+            async with session.get(f"http://{host}/cgi-bin/status") as response:
+                if response.status != 200:
+                    return None
+                data = json.loads(await response.text())
+        except (aiohttp.ClientError, TimeoutError, ValueError, OSError):
+            return None
+
+    # Un autre serveur web peut répondre du JSON : on exige des clés du Karotz
+    if not isinstance(data, dict) or not {"version", "sleep"} & data.keys():
+        return None
+    LOGGER.debug("Karotz trouvé à %s: %s", host, data.get("version"))
+    return KarotzDiscoveryResult(host, data.get("version"), data.get("wlan_mac"))
+
+
+async def async_discover(
+    hosts: Iterable[str],
+    skip: Iterable[str] = (),
+    concurrency: int = DISCOVERY_CONCURRENCY,
+) -> list[KarotzDiscoveryResult]:
+    """Probe hosts ("ip" or "ip:port") concurrently, ranked by rank_results.
+
+    Hosts in skip (already configured) are not probed.
+    """
+    skipped = set(skip)
+    targets = [host for host in hosts if host not in skipped]
+    if not targets:
+        return []
+
+    semaphore = asyncio.Semaphore(concurrency)
+    timeout = aiohttp.ClientTimeout(
+        total=DISCOVERY_TIMEOUT, sock_connect=DISCOVERY_CONNECT_TIMEOUT
+    )
+    # Session dédiée : pas de keep-alive, un hôte n'est sondé qu'une fois
+    connector = aiohttp.TCPConnector(limit=concurrency, force_close=True)
+    started = asyncio.get_running_loop().time()
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        results = await asyncio.gather(
+            *(_async_probe(session, host, semaphore) for host in targets)
+        )
+
+    found = rank_results(result for result in results if result is not None)
+    LOGGER.debug(
+        "%d hôte(s) sondé(s) en %.1f s, %d Karotz trouvé(s)",
+        len(targets),
+        asyncio.get_running_loop().time() - started,
+        len(found),
+    )
+    return found
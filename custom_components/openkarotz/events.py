@@ -0,0 +1,257 @@
+"""Webhook (push) events for OpenKarotz."""
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+import aiohttp.web
+from homeassistant.core import HomeAssistant
+from homeassistant.util.json import json_loads
+
+from .const import (
+    DOMAIN,
+    EVENT_DEDUP_MAX_ENTRIES,
+    EVENT_ID_TTL,
+    LOGGER,
+    WEBHOOK_MAX_BATCH,
+)
+from .coordinator import KarotzCoordinator
+
+
+class KarotzEventDeduplicator:
+    """Suppress repeated webhook events within a hold-off window.
+
+    Events are keyed on their optional "event_id" (idempotency key) or else on
+    (event_type, rfid_id/event). For RFID tags a repeat extends the window, so
+    a tag resting on the reader fires only once; for anything else the window
+    counts from the first event, so real successive clicks still go through.
+    """
+
+    # Types dont la fenêtre glisse à chaque répétition (tag posé sur le lecteur)
+    SLIDING_EVENT_TYPES = frozenset({"rfid"})
+
+    def __init__(self, holdoffs: dict[str, float]) -> None:
+        """Initialize the deduplicator with a hold-off per event type."""
+        self._holdoffs = holdoffs
+        # clé -> instant d'expiration, dans l'ordre du dernier passage
+        self._seen: OrderedDict[tuple[str, str], float] = OrderedDict()
+        self.suppressed: dict[str, int] = {}
+
+    def is_duplicate(self, event: dict[str, Any], required: str, now: float) -> bool:
+        """Record an event and return True if it repeats a recent one."""
+        # Purger les entrées expirées les plus anciennes
+        while self._seen:
+            key, expires = next(iter(self._seen.items()))
+            if expires > now:
+                break
+            del self._seen[key]
+
+        event_type = event["event_type"]
+        if event_id := event.get("event_id"):
+            key = ("event_id", str(event_id))
+            window = float(EVENT_ID_TTL)
+            sliding = False
+        else:
+            key = (event_type, str(event[required]))
+            window = self._holdoffs.get(event_type, 0.0)
+            sliding = event_type in self.SLIDING_EVENT_TYPES
+
+        duplicate = self._seen.get(key, 0.0) > now
+        if duplicate:
+            self.suppressed[event_type] = self.suppressed.get(event_type, 0) + 1
+
+        if window > 0 and (sliding or not duplicate):
+            self._seen[key] = now + window
+            self._seen.move_to_end(key)
+            if len(self._seen) > EVENT_DEDUP_MAX_ENTRIES:
+                self._seen.popitem(last=False)
+        return duplicate
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the deduplication counters."""
+        return {
+            "holdoffs": self._holdoffs,
+            "tracked_keys": len(self._seen),
+            "suppressed": dict(self.suppressed),
+        }
+
+
+class KarotzWebhookRoute:
+    """Everything the webhook hot path needs for one Karotz, resolved at setup."""
+
+    __slots__ = ("entry_id", "device_id", "name", "coordinator", "dedup")
+
+    def __init__(
+        self,
+        entry_id: str,
+        device_id: str,
+        name: str,
+        coordinator: KarotzCoordinator,
+        dedup: KarotzEventDeduplicator,
+    ) -> None:
+        """Initialize the route."""
+        self.entry_id = entry_id
+        self.device_id = device_id
+        self.name = name
+        self.coordinator = coordinator
+        self.dedup = dedup
+
+
+def _fire_rfid(hass: HomeAssistant, route: KarotzWebhookRoute, data: dict[str, Any]) -> None:
+    """Fire the native tag_scanned event."""
+    tag_id = data["rfid_id"]
+    LOGGER.info("Scan RFID natif reçu de %s, tag: %s", route.name, tag_id)
+
+    # === C'est ici qu'on s'intègre au système RFID natif de HA ===
+    hass.bus.async_fire(
+        "tag_scanned",
+        {"tag_id": tag_id, "device_id": route.device_id},
+    )
+
+
+def _fire_button(hass: HomeAssistant, route: KarotzWebhookRoute, data: dict[str, Any]) -> None:
+    """Fire the button event caught by device_trigger.py."""
+    event = data["event"] # ex: "click", "dclick", "lclick_start"
+    LOGGER.info("Événement Bouton reçu de %s: %s", route.name, event)
+
+    hass.bus.async_fire(
+        f"{DOMAIN}_event",
+        {
+            "device_id": route.device_id,
+            "type": event,
+        },
+    )
+
+
+# event_type -> (champ obligatoire, gestionnaire)
+EVENT_HANDLERS: dict[
+    str,
+    tuple[str, Callable[[HomeAssistant, KarotzWebhookRoute, dict[str, Any]], None]],
+] = {
+    "rfid": ("rfid_id", _fire_rfid),
+    "button": ("event", _fire_button),
+}
+
+
+# Marqueur pour une ligne NDJSON illisible dans un lot
+_INVALID_JSON = object()
+
+
+def _parse_events(body: bytes) -> tuple[list[Any], bool]:
+    """Split a webhook body into events and tell whether it was a batch.
+
+    Accepts a single JSON object, a JSON array of objects or newline-delimited
+    JSON objects. Raises ValueError when the body cannot be read at all.
+    """
+    body = body.strip()
+    if body.startswith(b"["):
+        events = json_loads(body)
+        if not isinstance(events, list):
+            raise ValueError("Invalid JSON array")
+        return events, True
+
+    try:
+        return [json_loads(body)], False
+    except ValueError:
+        lines = [line for line in body.splitlines() if line.strip()]
+        if len(lines) <= 1:
+            raise
+
+    # NDJSON : une ligne illisible n'invalide pas les autres
+    events: list[Any] = []
+    for line in lines:
+        try:
+            events.append(json_loads(line))
+        except ValueError:
+            events.append(_INVALID_JSON)
+    return events, True
+
+
+def _validate_event(
+    event: Any,
+) -> tuple[
+    tuple[str, Callable[[HomeAssistant, KarotzWebhookRoute, dict[str, Any]], None]] | None,
+    str | None,
+]:
+    """Return the handler for an event, or the reason it is rejected."""
+    if not isinstance(event, dict):
+        return None, "Invalid JSON"
+
+    # Une liste ou un objet ne peut pas servir de clé : refusé, pas une erreur 500
+    event_type = event.get("event_type")
+    if not isinstance(event_type, str):
+        return None, "Unknown event_type"
+
+    handler = EVENT_HANDLERS.get(event_type)
+    if handler is None:
+        return None, "Unknown event_type"
+
+    required, _ = handler
+    if not event.get(required):
+        return None, f"Missing {required}"
+    return handler, None
+
+
+async def handle_webhook(
+    hass: HomeAssistant, webhook_id: str, request: aiohttp.web.Request
+) -> aiohttp.web.Response:
+    """Handle incoming webhook from Karotz dbus_watcher.
+
+    The body is either one event or a batch (JSON array or NDJSON). A batch
+    is answered with one status per event, in order.
+    """
+
+    # 1. Trouver la route (appareil, nom, coordinateur) préparée au setup
+    route: KarotzWebhookRoute | None = hass.data[DOMAIN]["webhooks"].get(webhook_id)
+    if route is None:
+        LOGGER.warning("Webhook reçu pour un ID inconnu: %s", webhook_id)
+        return aiohttp.web.Response(status=404, text="Webhook ID not found")
+
+    # 2. Parser le JSON (POST), objet seul ou lot
+    try:
+        events, is_batch = _parse_events(await request.read())
+    except ValueError as err:
+        LOGGER.warning("Erreur de parsing JSON du webhook Karotz: %s", err)
+        return aiohttp.web.Response(status=400, text="Invalid JSON")
+    if len(events) > WEBHOOK_MAX_BATCH:
+        LOGGER.warning("Lot de %s événements refusé pour %s", len(events), route.name)
+        return aiohttp.web.Response(status=400, text="Batch too large")
+    LOGGER.debug("Webhook reçu de %s: %s", route.name, events)
+
+    # 3. Valider tous les événements en une passe
+    checked = [_validate_event(event) for event in events]
+
+    if not is_batch:
+        _, error = checked[0]
+        if error is not None:
+            LOGGER.warning("Événement webhook Karotz refusé (%s): %s", error, events[0])
+            return aiohttp.web.Response(status=400, text=error)
+
+    # 4. Déclencher les événements valides dans l'ordre, sans les doublons
+    now = hass.loop.time()
+    results: list[dict[str, str]] = []
+    for event, (handler, error) in zip(events, checked):
+        if handler is None:
+            LOGGER.warning("Événement webhook Karotz refusé (%s): %s", error, event)
+            results.append({"status": "error", "error": error})
+            continue
+        required, fire = handler
+        if route.dedup.is_duplicate(event, required, now):
+            LOGGER.debug("Événement en double ignoré pour %s: %s", route.name, event)
+            results.append({"status": "duplicate"})
+            continue
+        fire(hass, route, event)
+        results.append({"status": "ok"})
+
+    # 5. Un événement physique déclenché : le statut du lapin va sûrement
+    # changer (un doublon rejoué par le Karotz ne relance pas le polling rapide)
+    if any(result["status"] == "ok" for result in results):
+        route.coordinator.async_note_activity()
+
+    if not is_batch:
+        if results[0]["status"] == "duplicate":
+            # 200 quand même : le Karotz ne doit pas renvoyer l'événement
+            return aiohttp.web.Response(status=200, text="Duplicate")
+        return aiohttp.web.Response(status=200, text="OK")
+    return aiohttp.web.json_response(results)
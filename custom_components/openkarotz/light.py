@@ -47,7 +47,7 @@ class KarotzLight(CoordinatorEntity[KarotzCoordinator], LightEntity):
         entry: ConfigEntry
     ):
         """Initialize the light."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=frozenset({"led_color"}))
         self._client = client
         self._entry = entry
         self._attr_unique_id = f"{entry.entry_id}_led"
@@ -69,21 +69,14 @@ class KarotzLight(CoordinatorEntity[KarotzCoordinator], LightEntity):
         """Return true if the light is on (based on coordinator state)."""
         if not self.coordinator.data:
             return False
-        color = self.coordinator.data.get("led_color", "000000")
-        return color != "000000"
+        return self.coordinator.data.led_on
 
     @property
     def rgb_color(self) -> tuple[int, int, int] | None:
         """Return the rgb color value."""
         if not self.is_on or not self.coordinator.data:
             return None
-
-        hex_color = self.coordinator.data.get("led_color", "000000")
-        try:
-            hex_color = hex_color.lstrip('#')
-            return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-        except (ValueError, TypeError):
-            return None
+        return self.coordinator.data.led_rgb
 
     async def async_turn_on(self, **kwargs) -> None:
         """Turn the light on."""
@@ -122,7 +115,6 @@ class KarotzLight(CoordinatorEntity[KarotzCoordinator], LightEntity):
     def _update_local_data(self, color_hex: str, pulse: bool) -> None:
         """Optimistically update the coordinator's data and HA state."""
         if self.coordinator.data:
-            self.coordinator.data["led_color"] = color_hex
-            self.coordinator.data["led_pulse"] = "1" if pulse else "0"
+            self.coordinator.data.set_led(color_hex, pulse)
         self.async_write_ha_state()
         self.hass.loop.create_task(self.coordinator.async_request_refresh())
\ No newline at end of file
@@ -0,0 +1,431 @@
+"""Local audio proxy and transcoding cache for OpenKarotz."""
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from contextlib import suppress
+import hashlib
+import hmac
+from http import HTTPStatus
+import os
+import re
+import secrets
+from typing import Any
+from urllib.parse import urlsplit
+
+import aiohttp
+from aiohttp import web
+
+from homeassistant.components import media_source
+from homeassistant.components.ffmpeg import get_ffmpeg_manager
+from homeassistant.components.http import HomeAssistantView
+from homeassistant.components.media_player import async_process_play_media_url
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.network import NoURLAvailableError, get_url
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    DOMAIN,
+    LOGGER,
+    MEDIA_BITRATE,
+    MEDIA_CACHE_DIR,
+    MEDIA_CACHE_MAX_SIZE,
+    MEDIA_CACHE_STORAGE_VERSION,
+    MEDIA_DIRECT_MAX_ENTRIES,
+    MEDIA_FAILURE_RETRY,
+    MEDIA_PROBE_TIMEOUT,
+    MEDIA_SAMPLE_RATE,
+    MEDIA_TRANSCODE_CONCURRENCY,
+    MEDIA_TRANSCODE_TIMEOUT,
+)
+
+MEDIA_URL = "/api/openkarotz/media/{name}"
+
+# Nom d'un fichier du cache : HMAC du média source, impossible à deviner
+_NAME = re.compile(r"^[0-9a-f]{64}\.mp3$")
+
+# Seuls ces protocoles sont ouverts par ffmpeg (pas de file:, concat:...)
+_SCHEMES = ("http", "https")
+_FFMPEG_PROTOCOLS = "http,https,tcp,tls"
+
+# Listes de lecture et flux : rien à transcoder, le lapin les lit tels quels
+_STREAM_CONTENT_TYPES = frozenset(
+    {
+        "application/vnd.apple.mpegurl",
+        "application/x-mpegurl",
+        "audio/mpegurl",
+        "audio/x-mpegurl",
+        "audio/x-scpls",
+    }
+)
+_STREAM_EXTENSIONS = (".m3u", ".m3u8", ".pls")
+
+
+class KarotzMediaCache:
+    """Transcode media once into small MP3 files served to the rabbits by HA.
+
+    A media (URL, media-source id or HA TTS URL) is resolved and transcoded by
+    an ffmpeg process, at most MEDIA_TRANSCODE_CONCURRENCY at a time, into a
+    mono low-bitrate MP3 the rabbit decodes cheaply. Files are kept on disk in
+    an LRU bounded to MEDIA_CACHE_MAX_SIZE bytes, so replaying a media costs
+    neither a transcode nor an internet fetch. Live streams and playlists are
+    handed to the rabbit as is; so is a media whose transcode failed, until
+    MEDIA_FAILURE_RETRY seconds have passed. Files handed to queued
+    announcements are pinned and never evicted.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the cache."""
+        self._hass = hass
+        self._path = hass.config.path(MEDIA_CACHE_DIR)
+        self._store: Store[dict[str, Any]] = Store(
+            hass, MEDIA_CACHE_STORAGE_VERSION, f"{DOMAIN}.media"
+        )
+        self._secret = b""
+        # Nom du fichier -> taille, du moins au plus récemment utilisé
+        self._index: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+        self._semaphore = asyncio.Semaphore(MEDIA_TRANSCODE_CONCURRENCY)
+        self._jobs: dict[str, asyncio.Task[bool]] = {}
+        # Flux à lire tels quels, persistés ; un dict sert d'ensemble ordonné
+        # pour oublier les plus anciens
+        self._direct: dict[str, None] = {}
+        # Échecs de transcodage (délai, réseau...) : lecture directe jusqu'à
+        # l'heure indiquée, puis nouvel essai
+        self._failed: dict[str, float] = {}
+        # Fichiers promis à une annonce en file : nombre d'annonces
+        self._pins: dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    async def async_load(self) -> None:
+        """Load the signing secret and index the files already on disk."""
+        stored = await self._store.async_load()
+        if stored is None:
+            stored = {"secret": secrets.token_hex(32)}
+            await self._store.async_save(stored)
+        self._secret = stored["secret"].encode()
+        # L'ancienne liste "direct" mêlait flux et échecs passagers : ignorée
+        self._direct = dict.fromkeys(stored.get("streams", []))
+
+        for name, size in await self._hass.async_add_executor_job(self._scan):
+            self._index[name] = size
+            self._size += size
+        LOGGER.debug(
+            "Cache audio : %d fichier(s), %d octet(s)", len(self._index), self._size
+        )
+
+    def _scan(self) -> list[tuple[str, int]]:
+        """List the cached files, oldest first (runs in the executor)."""
+        os.makedirs(self._path, exist_ok=True)
+        files = []
+        for entry in os.scandir(self._path):
+            if entry.name.endswith(".tmp"):
+                # Transcodage interrompu par un arrêt
+                os.unlink(entry.path)
+            elif _NAME.match(entry.name):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        return [(name, size) for _, name, size in sorted(files)]
+
+    def _name(self, media_id: str) -> str:
+        """Return the cache file name of a media."""
+        digest = hmac.new(self._secret, media_id.encode(), hashlib.sha256).hexdigest()
+        return f"{digest}.mp3"
+
+    def _local_url(self, name: str) -> str | None:
+        """Return the LAN URL of a cached file, None if HA has no local URL."""
+        try:
+            base = get_url(
+                self._hass, allow_external=False, allow_cloud=False, prefer_external=False
+            )
+        except NoURLAvailableError:
+            return None
+        return base + MEDIA_URL.format(name=name)
+
+    def is_local_url(self, url: str) -> bool:
+        """Return True if url is a transcoded file served by this cache."""
+        return urlsplit(url).path.startswith(MEDIA_URL.partition("{")[0])
+
+    @callback
+    def async_pin(self, url: str) -> CALLBACK_TYPE:
+        """Keep the cached file behind url from eviction until unpinned."""
+        if not self.is_local_url(url):
+            return lambda: None
+        name = urlsplit(url).path.rpartition("/")[2]
+        self._pins[name] = self._pins.get(name, 0) + 1
+        pinned = True
+
+        @callback
+        def unpin() -> None:
+            nonlocal pinned
+            if not pinned:
+                return
+            pinned = False
+            if self._pins[name] > 1:
+                self._pins[name] -= 1
+            else:
+                del self._pins[name]
+
+        return unpin
+
+    def path(self, name: str) -> str | None:
+        """Return the path of a cached file, None if it is not in the cache."""
+        if not _NAME.match(name) or name not in self._index:
+            return None
+        return os.path.join(self._path, name)
+
+    @callback
+    def _async_set_direct(self, name: str) -> None:
+        """Remember, across restarts, that a media is a stream played as is."""
+        self._direct.pop(name, None)
+        self._direct[name] = None
+        while len(self._direct) > MEDIA_DIRECT_MAX_ENTRIES:
+            del self._direct[next(iter(self._direct))]
+        self._store.async_delay_save(
+            lambda: {"secret": self._secret.decode(), "streams": list(self._direct)}
+        )
+
+    async def _async_is_stream(self, source: str) -> bool | None:
+        """Return True if source looks like a live stream or a playlist.
+
+        Only the response headers are read. Return None if the probe fails.
+        """
+        if urlsplit(source).path.lower().endswith(_STREAM_EXTENSIONS):
+            return True
+        session = async_get_clientsession(self._hass)
+        try:
+            async with session.get(
+                source, timeout=aiohttp.ClientTimeout(total=MEDIA_PROBE_TIMEOUT)
+            ) as response:
+                if response.status != 200:
+                    return None
+                # Pas de Content-Length ne suffit pas : beaucoup de serveurs
+                # envoient les fichiers en chunked
+                return (
+                    response.content_type in _STREAM_CONTENT_TYPES
+                    or any(header.lower().startswith("icy-") for header in response.headers)
+                )
+        except (aiohttp.ClientError, TimeoutError) as err:
+            LOGGER.debug("Sonde du média impossible: %s", err)
+            return None
+
+    async def async_get_url(self, media_id: str, entity_id: str | None = None) -> str:
+        """Return the URL the rabbit should play for a media.
+
+        This is the LAN URL of the transcoded file, or the resolved source URL
+        when the media cannot be transcoded.
+        """
+        # Clé : l'id d'origine, stable (l'URL résolue est signée à chaque fois) ;
+        # un média en cache est servi sans même être résolu
+        name = self._name(media_id)
+        local_url = self._local_url(name)
+        if local_url is not None and name in self._index:
+            self.hits += 1
+            self._index.move_to_end(name)
+            self._hass.async_add_executor_job(self._touch, name)
+            return local_url
+
+        if media_source.is_media_source_id(media_id):
+            play_item = await media_source.async_resolve_media(
+                self._hass, media_id, entity_id
+            )
+            source = async_process_play_media_url(self._hass, play_item.url)
+        else:
+            source = async_process_play_media_url(self._hass, media_id)
+
+        if (
+            local_url is None
+            or name in self._direct
+            or self._failed.get(name, 0.0) > self._hass.loop.time()
+            or urlsplit(source).scheme not in _SCHEMES
+        ):
+            return source
+
+        self.misses += 1
+        if (job := self._jobs.get(name)) is None:
+            # Un flux ferait tourner ffmpeg jusqu'au délai maximal
+            if (is_stream := await self._async_is_stream(source)) is None:
+                return source
+            if is_stream:
+                LOGGER.debug("Flux ou liste de lecture, lecture directe")
+                self._async_set_direct(name)
+                return source
+            # Un autre lecteur a pu lancer le transcodage pendant la sonde
+            if (job := self._jobs.get(name)) is None:
+                job = self._jobs[name] = self._hass.async_create_background_task(
+                    self._async_transcode(name, source), "openkarotz transcode"
+                )
+                job.add_done_callback(lambda _: self._jobs.pop(name, None))
+        # Un lecteur qui abandonne n'interrompt pas le transcodage des autres
+        return local_url if await asyncio.shield(job) else source
+
+    def _touch(self, name: str) -> None:
+        """Record a use in the file mtime, to keep the LRU order on restart."""
+        with suppress(OSError):
+            os.utime(os.path.join(self._path, name))
+
+    async def _async_transcode(self, name: str, source: str) -> bool:
+        """Transcode source into the cache; return True on success."""
+        path = os.path.join(self._path, name)
+        temp_path = f"{path}.tmp"
+        async with self._semaphore:
+            started = self._hass.loop.time()
+            try:
+                process = await self._async_start_ffmpeg(source, temp_path)
+            except OSError as err:
+                # ffmpeg absent : rien à mémoriser, le média n'y est pour rien
+                LOGGER.error("Impossible de lancer ffmpeg: %s", err)
+                return False
+            try:
+                _, stderr = await asyncio.wait_for(
+                    process.communicate(), MEDIA_TRANSCODE_TIMEOUT
+                )
+            except TimeoutError:
+                LOGGER.warning(
+                    "Transcodage de plus de %s s (flux en direct ?), lecture directe",
+                    MEDIA_TRANSCODE_TIMEOUT,
+                )
+                stderr = None
+                process.kill()
+                await process.wait()
+            finally:
+                if process.returncode is None:
+                    process.kill()
+
+        if stderr is None or process.returncode != 0:
+            if stderr is not None:
+                LOGGER.warning(
+                    "Échec du transcodage (%s): %s",
+                    process.returncode,
+                    stderr.decode(errors="replace").strip()[-200:],
+                )
+            # Peut-être passager (réseau, serveur lent) : lecture directe pour
+            # un temps, sans le mémoriser au-delà d'un redémarrage
+            self.failures += 1
+            self._async_set_failed(name)
+            await self._hass.async_add_executor_job(self._remove, temp_path)
+            return False
+
+        size = await self._hass.async_add_executor_job(self._commit, temp_path, path)
+        self._failed.pop(name, None)
+        self._index[name] = size
+        self._size += size
+        LOGGER.debug(
+            "Média transcodé en %.1f s (%d octet(s))",
+            self._hass.loop.time() - started,
+            size,
+        )
+        await self._async_evict()
+        return True
+
+    @callback
+    def _async_set_failed(self, name: str) -> None:
+        """Play a media as is for MEDIA_FAILURE_RETRY seconds."""
+        now = self._hass.loop.time()
+        self._failed = {
+            failed: until for failed, until in self._failed.items() if until > now
+        }
+        self._failed[name] = now + MEDIA_FAILURE_RETRY
+        while len(self._failed) > MEDIA_DIRECT_MAX_ENTRIES:
+            del self._failed[next(iter(self._failed))]
+
+    async def _async_start_ffmpeg(
+        self, source: str, temp_path: str
+    ) -> asyncio.subprocess.Process:
+        """Start ffmpeg transcoding source into temp_path."""
+        return await asyncio.create_subprocess_exec(
+            get_ffmpeg_manager(self._hass).binary,
+            "-nostdin",
+            "-y",
+            "-loglevel",
+            "error",
+            "-protocol_whitelist",
+            _FFMPEG_PROTOCOLS,
+            "-i",
+            source,
+            "-vn",
+            "-ac",
+            "1",
+            "-ar",
+            str(MEDIA_SAMPLE_RATE),
+            "-b:a",
+            MEDIA_BITRATE,
+            "-f",
+            "mp3",
+            temp_path,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+
+    @staticmethod
+    def _commit(temp_path: str, path: str) -> int:
+        """Move a finished transcode into place and return its size."""
+        os.replace(temp_path, path)
+        return os.path.getsize(path)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        """Delete a file, if it exists."""
+        with suppress(FileNotFoundError):
+            os.unlink(path)
+
+    async def _async_evict(self) -> None:
+        """Delete the least recently used files beyond MEDIA_CACHE_MAX_SIZE.
+
+        Pinned files, promised to a queued announcement, are skipped.
+        """
+        for name in list(self._index):
+            if self._size <= MEDIA_CACHE_MAX_SIZE or len(self._index) <= 1:
+                break
+            if name in self._pins or name not in self._index:
+                continue
+            self._size -= self._index.pop(name)
+            await self._hass.async_add_executor_job(
+                self._remove, os.path.join(self._path, name)
+            )
+
+    async def async_shutdown(self) -> None:
+        """Stop the running transcodes."""
+        for job in list(self._jobs.values()):
+            job.cancel()
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return cache statistics."""
+        return {
+            "files": len(self._index),
+            "size": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+            "direct": len(self._direct),
+            "failed": len(self._failed),
+            "pinned": len(self._pins),
+            "transcoding": len(self._jobs),
+        }
+
+
+class KarotzMediaView(HomeAssistantView):
+    """Serve the transcoded files to the rabbits.
+
+    The rabbit cannot authenticate; file names are HMACs of the media, which
+    cannot be guessed without the secret. Range requests are handled by
+    FileResponse.
+    """
+
+    url = MEDIA_URL
+    name = "api:openkarotz:media"
+    requires_auth = False
+
+    def __init__(self, cache: KarotzMediaCache) -> None:
+        """Initialize the view."""
+        self._cache = cache
+
+    async def get(self, request: web.Request, name: str) -> web.StreamResponse:
+        """Return a cached file."""
+        if (path := self._cache.path(name)) is None:
+            return web.Response(status=HTTPStatus.NOT_FOUND)
+        return web.FileResponse(path, headers={"Cache-Control": "max-age=86400"})
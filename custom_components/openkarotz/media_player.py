@@ -1,24 +1,36 @@
 """Media player platform for OpenKarotz."""
 import voluptuous as vol
+from functools import partial
 import math
 from typing import Any
 
+from homeassistant.components import media_source
 from homeassistant.components.media_player import (
+    BrowseMedia,
     MediaPlayerEntity,
     MediaPlayerEntityFeature,
     MediaPlayerState,
     MediaType,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.core import HomeAssistant, ServiceCall, callback
 from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity # <-- IMPORT AJOUTÉ
 from homeassistant.helpers import entity_platform, config_validation as cv
 
+from .announce import KarotzAnnouncementQueue
 from .api import KarotzApiClient
-from .const import DOMAIN, LOGGER
+from .const import (
+    ANNOUNCE_DEFAULT_PRIORITY,
+    ANNOUNCE_PRIORITIES,
+    ANNOUNCE_RADIO_PRIORITY,
+    DOMAIN,
+    LOGGER,
+)
 from .coordinator import KarotzCoordinator # Importé pour lire le volume
+from .media import KarotzMediaCache
+from .speech import KarotzSpeechPipeline
 
 # --- NOUVELLES FONCTIONNALITÉS (basées sur Jeedom) ---
 # L'API OpenKarotz a un volume de 0 à 20
@@ -32,17 +44,27 @@ SUPPORT_KAROTZ = (
     | MediaPlayerEntityFeature.STOP
     | MediaPlayerEntityFeature.VOLUME_SET
     | MediaPlayerEntityFeature.VOLUME_STEP
+    | MediaPlayerEntityFeature.MEDIA_ANNOUNCE
+    | MediaPlayerEntityFeature.BROWSE_MEDIA
 )
 
 # Schémas pour les nouveaux services
+PRIORITY = vol.In(list(ANNOUNCE_PRIORITIES))
 SERVICE_PLAY_MOOD = {
     vol.Required("mood_id"): cv.positive_int,
+    vol.Optional("priority", default=ANNOUNCE_DEFAULT_PRIORITY): PRIORITY,
 }
 SERVICE_PLAY_SOUND = {
     vol.Required("sound_id"): cv.string,
+    vol.Optional("priority", default=ANNOUNCE_DEFAULT_PRIORITY): PRIORITY,
 }
 SERVICE_PLAY_RADIO = {
     vol.Required("radio_id"): cv.positive_int,
+    vol.Optional("priority", default=ANNOUNCE_RADIO_PRIORITY): PRIORITY,
+}
+SERVICE_PREWARM = {
+    vol.Required("phrases"): vol.All(cv.ensure_list, [cv.string]),
+    vol.Optional("voice", default="claire"): cv.string,
 }
 
 
@@ -55,8 +77,11 @@ async def async_setup_entry(
     client: KarotzApiClient = hass.data[DOMAIN][entry.entry_id]["client"]
     # Nous avons besoin du coordinateur pour lire le volume
     coordinator: KarotzCoordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    speech: KarotzSpeechPipeline = hass.data[DOMAIN][entry.entry_id]["speech"]
+    queue: KarotzAnnouncementQueue = hass.data[DOMAIN][entry.entry_id]["announcements"]
+    media: KarotzMediaCache = hass.data[DOMAIN]["media"]
     
-    player = KarotzMediaPlayer(client, coordinator, entry)
+    player = KarotzMediaPlayer(client, coordinator, queue, speech, media, entry)
     async_add_entities([player])
 
     # --- ENREGISTREMENT DES NOUVEAUX SERVICES ---
@@ -77,6 +102,11 @@ async def async_setup_entry(
         SERVICE_PLAY_RADIO,
         player.async_service_play_radio,
     )
+    platform.async_register_entity_service(
+        "prewarm",
+        SERVICE_PREWARM,
+        player.async_service_prewarm,
+    )
 
 
 class KarotzMediaPlayer(CoordinatorEntity[KarotzCoordinator], MediaPlayerEntity):
@@ -87,21 +117,27 @@ class KarotzMediaPlayer(CoordinatorEntity[KarotzCoordinator], MediaPlayerEntity)
     _attr_supported_features = SUPPORT_KAROTZ
     _attr_icon = "mdi:rabbit"
     
-    # Cet appareil est "optimiste" pour l'état de lecture,
-    # mais lit le volume depuis le coordinateur
+    # L'état de lecture suit la file d'annonces (lecture en cours ou non) ;
+    # le volume est lu depuis le coordinateur
     _attr_should_poll = False 
 
     def __init__(
         self,
         client: KarotzApiClient,
         coordinator: KarotzCoordinator,
+        queue: KarotzAnnouncementQueue,
+        speech: KarotzSpeechPipeline,
+        media: KarotzMediaCache,
         entry: ConfigEntry
     ) -> None:
         """Initialize the media player."""
-        # Lier au coordinateur pour le volume
-        super().__init__(coordinator) 
+        # Lier au coordinateur pour le volume (notifié seulement s'il change)
+        super().__init__(coordinator, context=frozenset({"volume"}))
         
         self._client = client
+        self._queue = queue
+        self._speech = speech
+        self._media = media
         self._entry = entry
         self._attr_unique_id = f"{entry.entry_id}_player"
         self._attr_state = MediaPlayerState.IDLE # État optimiste
@@ -112,21 +148,46 @@ class KarotzMediaPlayer(CoordinatorEntity[KarotzCoordinator], MediaPlayerEntity)
         return DeviceInfo(
             identifiers={(DOMAIN, self._entry.entry_id)},
         )
+
+    async def async_added_to_hass(self) -> None:
+        """Follow the announcement queue."""
+        await super().async_added_to_hass()
+        self.async_on_remove(self._queue.async_add_listener(self._async_queue_updated))
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """Return the announcement queue and TTS timings."""
+        attributes: dict[str, Any] = {
+            "queue_depth": self._queue.depth,
+            "current_priority": self._queue.current_priority,
+            "dropped": self._queue.dropped,
+        }
+        if self._queue.last_wait is not None:
+            attributes["queue_wait"] = round(self._queue.last_wait, 1)
+        if self._speech.last_time_to_first_audio is not None:
+            attributes["time_to_first_audio"] = round(
+                self._speech.last_time_to_first_audio * 1000
+            )
+        return attributes
+
+    @callback
+    def _async_queue_updated(self) -> None:
+        """Set PLAYING while an announcement plays, IDLE once the queue is done."""
+        if not self._queue.playing:
+            self._attr_state = MediaPlayerState.IDLE
+        elif self._attr_state != MediaPlayerState.PAUSED:
+            self._attr_state = MediaPlayerState.PLAYING
+        self.async_write_ha_state()
     
     # --- PROPRIÉTÉS DE VOLUME (lues depuis le coordinateur) ---
 
     @property
     def volume_level(self) -> float | None:
         """Volume level of the media player (0..1)."""
-        if not self.coordinator.data:
-            return None
-        try:
-            # Lire le volume (0-20) depuis /cgi-bin/status
-            karotz_vol = int(self.coordinator.data.get("volume", 10))
-            # Convertir en échelle 0.0 - 1.0 pour HA
-            return karotz_vol / KAROTZ_MAX_VOLUME
-        except (ValueError, TypeError):
+        if not self.coordinator.data or self.coordinator.data.volume is None:
             return None
+        # Convertir le volume Karotz (0-20) en échelle 0.0 - 1.0 pour HA
+        return self.coordinator.data.volume / KAROTZ_MAX_VOLUME
 
     # --- COMMANDES DE LECTURE (optimistes) ---
 
@@ -134,36 +195,68 @@ class KarotzMediaPlayer(CoordinatorEntity[KarotzCoordinator], MediaPlayerEntity)
         self, media_type: MediaType | str, media_id: str, **kwargs
     ) -> None:
         """Play media."""
-        success = False
-        
-        # Gérer le service tts.say
+        # Priorité : extra.priority, sinon "high" pour une annonce
+        priority = (kwargs.get("extra") or {}).get("priority")
+        if priority is None:
+            priority = "high" if kwargs.get("announce") else ANNOUNCE_DEFAULT_PRIORITY
+        elif priority not in ANNOUNCE_PRIORITIES:
+            LOGGER.warning("Priorité inconnue %s, %s utilisée", priority, ANNOUNCE_DEFAULT_PRIORITY)
+            priority = ANNOUNCE_DEFAULT_PRIORITY
+
+        # Gérer le service tts.say (découpé en phrases, le suivi de lecture
+        # est assuré par le pipeline)
         if media_type == "tts":
-            success = await self._client.async_tts(text=media_id)
-        
-        # Gérer le service media_player.play_media (URL)
-        elif media_type == MediaType.MUSIC or media_id.startswith("http"):
-            success = await self._client.async_play_sound(url=media_id)
+            await self._queue.async_submit(
+                ("tts", media_id),
+                priority,
+                partial(self._speech.async_speak, media_id),
+                tracks_itself=True,
+            )
+
+        # Gérer le service media_player.play_media (URL, media source, TTS
+        # de Home Assistant) : le lapin lit la version transcodée, en local
+        elif (
+            media_type == MediaType.MUSIC
+            or media_id.startswith("http")
+            or media_source.is_media_source_id(media_id)
+        ):
+            url = await self._media.async_get_url(media_id, self.entity_id)
+            await self._queue.async_submit(
+                ("url", media_id),
+                priority,
+                partial(self._client.async_play_sound, url=url),
+                # URL d'origine (flux, radio web) : pas de durée maximale
+                stream=not self._media.is_local_url(url),
+                # Le fichier transcodé ne doit pas être évincé avant la lecture
+                release=self._media.async_pin(url),
+            )
             
         else:
             self.hass.async_create_task(
                 self._client.async_tts(f"Type de média {media_type} non supporté.")
             )
 
-        if success:
-            self._attr_state = MediaPlayerState.PLAYING
-            self.async_write_state()
+    async def async_browse_media(
+        self,
+        media_content_type: MediaType | str | None = None,
+        media_content_id: str | None = None,
+    ) -> BrowseMedia:
+        """Browse the audio of the media sources."""
+        return await media_source.async_browse_media(
+            self.hass,
+            media_content_id,
+            content_filter=lambda item: item.media_content_type.startswith("audio/"),
+        )
 
     async def async_media_pause(self) -> None:
         """Pause the media (toggle)."""
         if await self._client.async_sound_control(cmd="pause"):
             self._attr_state = MediaPlayerState.PAUSED
-            self.async_write_state()
+            self.async_write_ha_state()
 
     async def async_media_stop(self) -> None:
-        """Stop the media."""
-        if await self._client.async_sound_control(cmd="quit"):
-            self._attr_state = MediaPlayerState.IDLE
-            self.async_write_state()
+        """Stop the media and drop the pending announcements."""
+        await self._queue.async_clear()
             
     # --- COMMANDES DE VOLUME (avec mise à jour optimiste) ---
             
@@ -175,8 +268,8 @@ class KarotzMediaPlayer(CoordinatorEntity[KarotzCoordinator], MediaPlayerEntity)
         if await self._client.async_set_volume(karotz_vol):
             # Mettre à jour le coordinateur localement pour la réactivité
             if self.coordinator.data:
-                self.coordinator.data["volume"] = str(karotz_vol)
-                self.async_write_state()
+                self.coordinator.data.volume = karotz_vol
+                self.async_write_ha_state()
                 # Demander un rafraîchissement pour confirmer
                 await self.coordinator.async_request_refresh()
 
@@ -194,23 +287,22 @@ class KarotzMediaPlayer(CoordinatorEntity[KarotzCoordinator], MediaPlayerEntity)
 
     # --- GESTIONNAIRES DE SERVICES PERSONNALISÉS ---
 
-    async def async_service_play_mood(self, mood_id: int) -> None:
+    async def async_service_play_mood(self, mood_id: int, priority: str) -> None:
         """Service call to play a mood."""
         LOGGER.info("Appel du service play_mood, ID: %s", mood_id)
-        if await self._client.async_play_mood(mood_id):
-            self._attr_state = MediaPlayerState.PLAYING
-            self.async_write_state()
+        await self._queue.async_play_mood(mood_id, priority)
 
-    async def async_service_play_sound(self, sound_id: str) -> None:
+    async def async_service_play_sound(self, sound_id: str, priority: str) -> None:
         """Service call to play a local sound."""
         LOGGER.info("Appel du service play_sound, ID: %s", sound_id)
-        if await self._client.async_play_sound_local(sound_id):
-            self._attr_state = MediaPlayerState.PLAYING
-            self.async_write_state()
+        await self._queue.async_play_sound(sound_id, priority)
 
-    async def async_service_play_radio(self, radio_id: int) -> None:
+    async def async_service_play_radio(self, radio_id: int, priority: str) -> None:
         """Service call to play a radio."""
         LOGGER.info("Appel du service play_radio, ID: %s", radio_id)
-        if await self._client.async_play_radio(radio_id):
-            self._attr_state = MediaPlayerState.PLAYING
-            self.async_write_state()
\ No newline at end of file
+        await self._queue.async_play_radio(radio_id, priority)
+
+    async def async_service_prewarm(self, phrases: list[str], voice: str) -> None:
+        """Service call to pre-warm TTS phrases in the rabbit's cache."""
+        LOGGER.info("Appel du service prewarm, %d phrase(s)", len(phrases))
+        self._speech.async_prewarm(phrases, voice)
@@ -0,0 +1,183 @@
+"""Per-endpoint request metrics for OpenKarotz."""
+from __future__ import annotations
+
+import time
+from typing import Any
+
+# Bornes supérieures des seaux de latence, en millisecondes, de 25 ms à 12,8 s
+# par pas de racine de 2. Le dernier seau (au-delà) recueille les timeouts :
+# mémoire constante par appareil.
+LATENCY_BUCKETS_MS: tuple[float, ...] = tuple(
+    round(25 * 2 ** (step / 2)) for step in range(19)
+)
+
+# Fenêtre glissante : un jeu de compteurs par minute, dans un anneau ; une
+# minute sortie de la fenêtre est recyclée au lieu de s'accumuler pour toujours.
+WINDOW_MINUTES = 60
+
+OUTCOME_SUCCESS = "success"
+OUTCOME_ERROR = "error"
+OUTCOME_TIMEOUT = "timeout"
+
+
+class _MinuteSlot:
+    """Histogram and counters of the requests made during one minute."""
+
+    __slots__ = ("minute", "buckets", "successes", "errors", "timeouts", "max_ms")
+
+    def __init__(self) -> None:
+        """Initialize an unused slot."""
+        self.reset(-WINDOW_MINUTES)
+
+    def reset(self, minute: int) -> None:
+        """Empty the slot and assign it to minute."""
+        self.minute = minute
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.successes = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.max_ms = 0.0
+
+
+class KarotzEndpointMetrics:
+    """Latency histogram and outcome counters for one cgi-bin endpoint.
+
+    Only the requests of the last WINDOW_MINUTES minutes are counted, so the
+    figures follow the current health of the rabbit.
+    """
+
+    __slots__ = ("_slots",)
+
+    def __init__(self) -> None:
+        """Initialize empty metrics."""
+        self._slots = [_MinuteSlot() for _ in range(WINDOW_MINUTES)]
+
+    def _window(self) -> list[_MinuteSlot]:
+        """Return the slots of the last WINDOW_MINUTES minutes."""
+        minute = int(time.monotonic() // 60)
+        return [slot for slot in self._slots if minute - slot.minute < WINDOW_MINUTES]
+
+    @property
+    def buckets(self) -> list[int]:
+        """Return the latency histogram over the window."""
+        buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        for slot in self._window():
+            for index, hits in enumerate(slot.buckets):
+                buckets[index] += hits
+        return buckets
+
+    @property
+    def successes(self) -> int:
+        """Return the number of successful requests over the window."""
+        return sum(slot.successes for slot in self._window())
+
+    @property
+    def errors(self) -> int:
+        """Return the number of failed requests over the window."""
+        return sum(slot.errors for slot in self._window())
+
+    @property
+    def timeouts(self) -> int:
+        """Return the number of timed out requests over the window."""
+        return sum(slot.timeouts for slot in self._window())
+
+    @property
+    def max_ms(self) -> float:
+        """Return the slowest request over the window, in milliseconds."""
+        return max((slot.max_ms for slot in self._window()), default=0.0)
+
+    @property
+    def count(self) -> int:
+        """Return the number of recorded requests."""
+        return self.successes + self.errors + self.timeouts
+
+    @property
+    def error_rate(self) -> float | None:
+        """Return the share of requests that failed or timed out."""
+        if not self.count:
+            return None
+        return (self.errors + self.timeouts) / self.count
+
+    def record(self, latency_ms: float, outcome: str) -> None:
+        """Record one request."""
+        minute = int(time.monotonic() // 60)
+        slot = self._slots[minute % WINDOW_MINUTES]
+        if slot.minute != minute:
+            # Seau d'il y a WINDOW_MINUTES minutes (ou plus) : on le recycle
+            slot.reset(minute)
+
+        index = len(LATENCY_BUCKETS_MS)
+        for position, bound in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= bound:
+                index = position
+                break
+        slot.buckets[index] += 1
+        slot.max_ms = max(slot.max_ms, latency_ms)
+
+        if outcome == OUTCOME_SUCCESS:
+            slot.successes += 1
+        elif outcome == OUTCOME_TIMEOUT:
+            slot.timeouts += 1
+        else:
+            slot.errors += 1
+
+    def quantile(self, q: float) -> float | None:
+        """Estimate a latency quantile (ms) by interpolating inside its bucket."""
+        buckets = self.buckets
+        max_ms = self.max_ms
+        total = sum(buckets)
+        if not total:
+            return None
+
+        rank = q * total
+        seen = 0
+        for index, hits in enumerate(buckets):
+            if hits and seen + hits >= rank:
+                lower = LATENCY_BUCKETS_MS[index - 1] if index else 0.0
+                upper = (
+                    LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else max_ms
+                )
+                upper = min(upper, max_ms)
+                return lower + (upper - lower) * (rank - seen) / hits
+            seen += hits
+        return max_ms
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return a summary of the metrics."""
+        p50, p95, p99 = (self.quantile(q) for q in (0.5, 0.95, 0.99))
+        return {
+            "window_minutes": WINDOW_MINUTES,
+            "requests": self.count,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "error_rate": round(self.error_rate, 4) if self.error_rate is not None else None,
+            "p50_ms": round(p50, 1) if p50 is not None else None,
+            "p95_ms": round(p95, 1) if p95 is not None else None,
+            "p99_ms": round(p99, 1) if p99 is not None else None,
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+class KarotzMetrics:
+    """Request metrics of one Karotz, per endpoint."""
+
+    def __init__(self) -> None:
+        """Initialize the metrics."""
+        self._endpoints: dict[str, KarotzEndpointMetrics] = {}
+
+    def record(self, endpoint: str, latency: float, outcome: str) -> None:
+        """Record a request that took latency seconds."""
+        if (metrics := self._endpoints.get(endpoint)) is None:
+            metrics = self._endpoints[endpoint] = KarotzEndpointMetrics()
+        metrics.record(latency * 1000, outcome)
+
+    def get(self, endpoint: str) -> KarotzEndpointMetrics | None:
+        """Return the metrics of an endpoint, if it was ever called."""
+        return self._endpoints.get(endpoint)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return a summary for every endpoint."""
+        return {
+            endpoint: metrics.as_dict()
+            for endpoint, metrics in self._endpoints.items()
+        }
@@ -0,0 +1,148 @@
+"""Data models for OpenKarotz."""
+from __future__ import annotations
+
+from typing import Any
+
+# Suffixes de taille renvoyés par le Karotz (sortie de "df -h")
+_SIZE_UNITS = {"K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def _to_int(value: Any) -> int | None:
+    """Convert a status value to an int, or None."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_percent(value: Any) -> float | None:
+    """Convert "37" or "37%" to a float, or None."""
+    try:
+        return float(str(value).rstrip("%"))
+    except ValueError:
+        return None
+
+
+def _to_bytes(value: Any) -> int | None:
+    """Convert a human-readable size such as "149.5M" to bytes, or None."""
+    if value is None:
+        return None
+    text = str(value).strip().upper()
+    multiplier = _SIZE_UNITS.get(text[-1:], 1)
+    if text[-1:] in _SIZE_UNITS:
+        text = text[:-1]
+    try:
+        size = float(text)
+    except ValueError:
+        return None
+    if size < 0:
+        return None
+    return int(size * multiplier)
+
+
+def _to_rgb(color: str) -> tuple[int, int, int] | None:
+    """Convert "RRGGBB" to an RGB tuple, or None."""
+    try:
+        return (int(color[0:2], 16), int(color[2:4], 16), int(color[4:6], 16))
+    except (ValueError, IndexError):
+        return None
+
+
+class KarotzStatus:
+    """The /cgi-bin/status payload, parsed once per poll.
+
+    Attribute names match the status keys so entities can subscribe to them.
+    "raw" keeps the payload as sent by the device.
+    """
+
+    __slots__ = (
+        "raw",
+        "version",
+        "wlan_mac",
+        "led_color",
+        "led_rgb",
+        "led_pulse",
+        "sleep",
+        "volume",
+        "karotz_free_space",
+        "karotz_percent_used_space",
+        "nb_tags",
+        "nb_moods",
+        "nb_sounds",
+        "tts_cache_size",
+    )
+
+    # Champs comparés entre deux polls (tout sauf la charge brute)
+    FIELDS: tuple[str, ...] = __slots__[1:]
+
+    raw: dict[str, Any]
+    version: str | None
+    wlan_mac: str | None
+    led_color: str
+    led_rgb: tuple[int, int, int] | None
+    led_pulse: bool
+    sleep: bool
+    volume: int | None
+    karotz_free_space: int | None
+    karotz_percent_used_space: float | None
+    nb_tags: int | None
+    nb_moods: int | None
+    nb_sounds: int | None
+    tts_cache_size: int | None
+
+    @classmethod
+    def from_dict(cls, raw: dict[str, Any]) -> KarotzStatus:
+        """Parse a raw status payload."""
+        status = cls()
+        status.raw = raw
+        status.version = raw.get("version")
+        status.wlan_mac = raw.get("wlan_mac")
+        status.set_led(str(raw.get("led_color") or "000000"), raw.get("led_pulse") == "1")
+        status.sleep = raw.get("sleep") == "1"
+        status.volume = _to_int(raw.get("volume"))
+        status.karotz_free_space = _to_bytes(raw.get("karotz_free_space"))
+        status.karotz_percent_used_space = _to_percent(raw.get("karotz_percent_used_space"))
+        status.nb_tags = _to_int(raw.get("nb_tags"))
+        status.nb_moods = _to_int(raw.get("nb_moods"))
+        status.nb_sounds = _to_int(raw.get("nb_sounds"))
+        status.tts_cache_size = _to_int(raw.get("tts_cache_size"))
+        return status
+
+    def set_led(self, color: str, pulse: bool) -> None:
+        """Set the LED color ("RRGGBB") and pulse, keeping led_rgb in sync."""
+        self.led_color = color.lstrip("#").upper()
+        self.led_rgb = _to_rgb(self.led_color)
+        self.led_pulse = pulse
+
+    @property
+    def led_on(self) -> bool:
+        """Return True if the LED is lit."""
+        return self.led_color != "000000"
+
+    def copy(self) -> KarotzStatus:
+        """Return a shallow copy."""
+        status = KarotzStatus()
+        for name in self.__slots__:
+            setattr(status, name, getattr(self, name))
+        return status
+
+    def changed_fields(self, other: KarotzStatus) -> set[str]:
+        """Return the fields whose value differs from other."""
+        return {
+            name for name in self.FIELDS if getattr(self, name) != getattr(other, name)
+        }
+
+    def __eq__(self, other: object) -> bool:
+        """Compare the parsed fields."""
+        if other is self:
+            return True
+        if not isinstance(other, KarotzStatus):
+            return NotImplemented
+        return not self.changed_fields(other)
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        """Return a readable representation."""
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.FIELDS)
+        return f"KarotzStatus({fields})"
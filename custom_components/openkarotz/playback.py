@@ -0,0 +1,148 @@
+"""Playback tracking for OpenKarotz."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+from typing import Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+
+from .api import KarotzApiClient
+from .const import (
+    LOGGER,
+    PLAYBACK_MAX_DURATION,
+    PLAYBACK_MAX_POLL_INTERVAL,
+    PLAYBACK_POLL_INTERVAL,
+    PLAYBACK_SLOW_AFTER,
+    PLAYBACK_START_GRACE,
+)
+
+
+class KarotzPlaybackTracker:
+    """Detect when what the rabbit plays (sound, TTS, radio) has ended.
+
+    /cgi-bin/status does not say whether a sound is playing, so while a
+    playback is followed the tracker probes sound_control every
+    PLAYBACK_POLL_INTERVAL seconds, then less and less often once it lasts.
+    Nothing is sent while idle. Listeners are called once when the playback
+    ends or is stopped.
+    """
+
+    def __init__(self, hass: HomeAssistant, client: KarotzApiClient) -> None:
+        """Initialize the tracker."""
+        self._hass = hass
+        self._client = client
+        self._task: asyncio.Task | None = None
+        self._started_at = 0.0
+        self._listeners: list[Callable[[], None]] = []
+        self._waiters: list[asyncio.Future[None]] = []
+        self.probes = 0
+        self.last_duration: float | None = None
+
+    @property
+    def playing(self) -> bool:
+        """Return True while a playback is being followed."""
+        return self._task is not None
+
+    @callback
+    def async_add_listener(self, ended_callback: Callable[[], None]) -> CALLBACK_TYPE:
+        """Register a callback invoked when a playback ends."""
+        self._listeners.append(ended_callback)
+
+        @callback
+        def remove_listener() -> None:
+            self._listeners.remove(ended_callback)
+
+        return remove_listener
+
+    async def async_wait_ended(self) -> None:
+        """Wait until the current playback has ended (now if idle)."""
+        if self._task is None:
+            return
+        waiter: asyncio.Future[None] = self._hass.loop.create_future()
+        self._waiters.append(waiter)
+        await waiter
+
+    @callback
+    def async_start(self, playing: bool = False, stream: bool = False) -> None:
+        """Follow a playback that was just started (replaces the current one).
+
+        With playing, the command reply already means the audio started (a tts
+        call returns once synthesized), so the first idle probe ends it
+        instead of waiting for PLAYBACK_START_GRACE. A stream (radio) is never
+        cut at PLAYBACK_MAX_DURATION.
+        """
+        self._cancel()
+        self._started_at = self._hass.loop.time()
+        self._task = self._hass.async_create_background_task(
+            self._async_watch(playing, stream), "openkarotz playback"
+        )
+
+    @callback
+    def async_stop(self) -> None:
+        """Mark the playback as ended (stop command or aborted sequence)."""
+        self._cancel()
+        self._async_ended()
+
+    @callback
+    def _cancel(self) -> None:
+        """Cancel the probing loop."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    @callback
+    def _async_ended(self) -> None:
+        """Notify the listeners that the playback ended."""
+        self.last_duration = self._hass.loop.time() - self._started_at
+        LOGGER.debug("Fin de lecture après %.1f s", self.last_duration)
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        for ended_callback in list(self._listeners):
+            ended_callback()
+
+    async def _async_watch(self, seen_playing: bool, stream: bool) -> None:
+        """Probe the rabbit until the playback has ended."""
+        loop = self._hass.loop
+        interval = PLAYBACK_POLL_INTERVAL
+        while True:
+            await asyncio.sleep(interval)
+            elapsed = loop.time() - self._started_at
+            if elapsed >= PLAYBACK_SLOW_AFTER:
+                # Lecture longue : inutile de solliciter le CGI chaque seconde
+                interval = min(interval * 2, PLAYBACK_MAX_POLL_INTERVAL)
+            if not stream and elapsed >= PLAYBACK_MAX_DURATION:
+                LOGGER.debug("Lecture plus longue que %s s, considérée finie", elapsed)
+                break
+
+            playing = await self._client.async_is_playing()
+            self.probes += 1
+            if playing is None:
+                # Lapin injoignable : inutile d'attendre la durée maximale
+                if not self._client.available:
+                    break
+                continue
+            if playing:
+                seen_playing = True
+            elif seen_playing or elapsed >= PLAYBACK_START_GRACE:
+                break
+
+        self._task = None
+        self._async_ended()
+
+    async def async_shutdown(self) -> None:
+        """Stop probing."""
+        self._cancel()
+        for waiter in self._waiters:
+            waiter.cancel()
+        self._waiters.clear()
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return tracker statistics."""
+        return {
+            "playing": self.playing,
+            "probes": self.probes,
+            "last_duration": self.last_duration,
+        }
@@ -0,0 +1,115 @@
+"""Fleet-wide poll scheduler for OpenKarotz."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+import random
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+
+from .const import (
+    COORDINATOR_POLL_INTERVAL,
+    FLEET_MAX_CONCURRENT_POLLS,
+    FLEET_POLL_JITTER,
+    LOGGER,
+)
+
+if TYPE_CHECKING:
+    from .coordinator import KarotzCoordinator
+
+
+class KarotzPollScheduler:
+    """Spread the status polls of every Karotz evenly over the poll interval."""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the scheduler."""
+        self._hass = hass
+        self._coordinators: dict[str, KarotzCoordinator] = {}
+        self._offsets: dict[str, float] = {}
+        self._semaphore = asyncio.Semaphore(FLEET_MAX_CONCURRENT_POLLS)
+        self._in_flight = 0
+
+    @callback
+    def async_register(self, entry_id: str, coordinator: KarotzCoordinator) -> CALLBACK_TYPE:
+        """Give a coordinator a slot in the fleet schedule."""
+        self._coordinators[entry_id] = coordinator
+        self._async_rebalance()
+
+        @callback
+        def unregister() -> None:
+            self._coordinators.pop(entry_id, None)
+            self._offsets.pop(entry_id, None)
+            self._async_rebalance()
+
+        return unregister
+
+    @callback
+    def _async_rebalance(self) -> None:
+        """Recompute evenly spaced slots, with jitter, for all coordinators."""
+        if not self._coordinators:
+            return
+
+        period = COORDINATOR_POLL_INTERVAL
+        slot = period / len(self._coordinators)
+        jitter = slot * FLEET_POLL_JITTER
+        for index, entry_id in enumerate(self._coordinators):
+            self._offsets[entry_id] = (
+                index * slot + random.uniform(-jitter, jitter)
+            ) % period
+
+        LOGGER.debug(
+            "Polling réparti sur %s lapin(s), un créneau toutes les %.1f s",
+            len(self._coordinators),
+            slot,
+        )
+
+    @callback
+    def async_align(self, entry_id: str, interval: float) -> float:
+        """Return a delay close to interval that lands the next poll on the entry's slot.
+
+        Fast polls (shorter than the base interval) follow a command and are
+        left untouched. The coordinator schedules its refresh in whole seconds,
+        so the delay is rounded to the second.
+        """
+        offset = self._offsets.get(entry_id)
+        if offset is None or interval < COORDINATOR_POLL_INTERVAL:
+            return interval
+
+        period = COORDINATOR_POLL_INTERVAL
+        phase = (self._hass.loop.time() + interval - offset) % period
+        # Aller vers le créneau le plus proche, avant ou après
+        if phase <= period / 2:
+            delay = interval - phase
+        else:
+            delay = interval + period - phase
+        # _schedule_refresh tronque à la seconde : une fraction serait perdue
+        return float(round(delay))
+
+    @asynccontextmanager
+    async def async_poll_slot(self) -> AsyncIterator[None]:
+        """Limit the number of status requests on the wire across the fleet."""
+        async with self._semaphore:
+            self._in_flight += 1
+            try:
+                yield
+            finally:
+                self._in_flight -= 1
+
+    @callback
+    def async_get_schedule(self) -> dict[str, Any]:
+        """Return the effective fleet schedule."""
+        return {
+            "max_concurrent_polls": FLEET_MAX_CONCURRENT_POLLS,
+            "polls_in_flight": self._in_flight,
+            "entries": {
+                entry_id: {
+                    "slot_offset": round(self._offsets.get(entry_id, 0.0), 2),
+                    "interval": coordinator.update_interval.total_seconds()
+                    if coordinator.update_interval
+                    else None,
+                }
+                for entry_id, coordinator in self._coordinators.items()
+            },
+        }
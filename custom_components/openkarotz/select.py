@@ -1,15 +1,20 @@
-"""Select platform for OpenKarotz (LED Effect)."""
+"""Select platform for OpenKarotz (LED effect and device catalogs)."""
 from __future__ import annotations
 
+from collections.abc import Awaitable, Callable
+
 from homeassistant.components.select import SelectEntity, SelectEntityDescription
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import ServiceValidationError
 from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
+from .announce import KarotzAnnouncementQueue
 from .api import KarotzApiClient
-from .const import DOMAIN
+from .catalog import KarotzCatalogCoordinator
+from .const import DOMAIN, LOGGER
 from .coordinator import KarotzCoordinator
 
 # Définition des effets de vitesse
@@ -28,6 +33,13 @@ ENTITY_DESCRIPTION = SelectEntityDescription(
     options=KAROTZ_EFFECT_LIST,
 )
 
+# Sélecteurs alimentés par les catalogues du lapin (clé = nom du catalogue)
+CATALOG_DESCRIPTIONS = (
+    SelectEntityDescription(key="moods", name="Humeur", icon="mdi:emoticon-outline"),
+    SelectEntityDescription(key="sounds", name="Son", icon="mdi:music-note"),
+    SelectEntityDescription(key="radios", name="Radio", icon="mdi:radio"),
+)
+
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -38,8 +50,28 @@ async def async_setup_entry(
     data = hass.data[DOMAIN][entry.entry_id]
     coordinator: KarotzCoordinator = data["coordinator"]
     client: KarotzApiClient = data["client"]
-    
-    async_add_entities([KarotzLedEffectSelect(coordinator, client, entry, ENTITY_DESCRIPTION)])
+    catalog: KarotzCatalogCoordinator = data["catalog"]
+    queue: KarotzAnnouncementQueue = data["announcements"]
+
+    # Même file d'annonces (et mêmes priorités) que les services du lecteur ;
+    # le type est celui des clés d'annonce de la file
+    play: dict[str, tuple[str, Callable[[str], Awaitable[str]]]] = {
+        "moods": ("mood", queue.async_play_mood),
+        "sounds": ("sound", queue.async_play_sound),
+        "radios": ("radio", queue.async_play_radio),
+    }
+
+    async_add_entities(
+        [
+            KarotzLedEffectSelect(coordinator, client, entry, ENTITY_DESCRIPTION),
+            *(
+                KarotzCatalogSelect(
+                    catalog, queue, entry, description, *play[description.key]
+                )
+                for description in CATALOG_DESCRIPTIONS
+            ),
+        ]
+    )
 
 
 class KarotzLedEffectSelect(CoordinatorEntity[KarotzCoordinator], SelectEntity):
@@ -56,7 +88,7 @@ class KarotzLedEffectSelect(CoordinatorEntity[KarotzCoordinator], SelectEntity):
         description: SelectEntityDescription,
     ) -> None:
         """Initialize the select entity."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=frozenset({"led_color", "led_pulse"}))
         self._client = client
         self._entry = entry
         self.entity_description = description
@@ -74,7 +106,7 @@ class KarotzLedEffectSelect(CoordinatorEntity[KarotzCoordinator], SelectEntity):
         """Return the selected entity option to represent the state."""
         # Si le coordinateur dit que la LED ne clignote pas,
         # on force l'état du sélecteur à "none".
-        if self.coordinator.data and self.coordinator.data.get("led_pulse") == "0":
+        if self.coordinator.data and not self.coordinator.data.led_pulse:
             self._attr_current_option = "none"
             return "none"
         
@@ -89,10 +121,9 @@ class KarotzLedEffectSelect(CoordinatorEntity[KarotzCoordinator], SelectEntity):
         # Récupérer la couleur actuelle depuis le coordinateur
         current_color = "00FF00" # Vert par défaut si inconnu
         if self.coordinator.data:
-            current_color = self.coordinator.data.get("led_color", "00FF00")
             # Si la LED est éteinte, on la met en vert
-            if current_color == "000000":
-                current_color = "00FF00"
+            if self.coordinator.data.led_on:
+                current_color = self.coordinator.data.led_color
 
         pulse = False
         speed = None
@@ -106,6 +137,94 @@ class KarotzLedEffectSelect(CoordinatorEntity[KarotzCoordinator], SelectEntity):
             # Mettre à jour l'état optimiste et le coordinateur
             self._attr_current_option = option
             if self.coordinator.data:
-                self.coordinator.data["led_pulse"] = "1" if pulse else "0"
+                self.coordinator.data.led_pulse = pulse
+            self.async_write_ha_state()
+            await self.coordinator.async_request_refresh()
+
+
+class KarotzCatalogSelect(CoordinatorEntity[KarotzCatalogCoordinator], SelectEntity):
+    """Play a mood, sound or radio picked from the cached device catalog.
+
+    The option shows the item while it is queued or playing, and is cleared
+    once it has ended.
+    """
+
+    _attr_has_entity_name = True
+    _attr_current_option: str | None = None
+
+    def __init__(
+        self,
+        coordinator: KarotzCatalogCoordinator,
+        queue: KarotzAnnouncementQueue,
+        entry: ConfigEntry,
+        description: SelectEntityDescription,
+        kind: str,
+        play: Callable[[str], Awaitable[str]],
+    ) -> None:
+        """Initialize the select entity."""
+        super().__init__(coordinator)
+        self._queue = queue
+        self._entry = entry
+        self._kind = kind
+        self._play = play
+        self.entity_description = description
+        self._attr_unique_id = f"{entry.entry_id}_{description.key}"
+        self._ids: dict[str, str] = {}
+        self._update_options()
+
+    @property
+    def device_info(self) -> DeviceInfo:
+        """Return device info."""
+        return DeviceInfo(
+            identifiers={(DOMAIN, self._entry.entry_id)},
+        )
+
+    @property
+    def available(self) -> bool:
+        """Return True while a catalog is known, even if a refresh failed."""
+        return bool(self._ids)
+
+    @callback
+    def _update_options(self) -> None:
+        """Build the option list (item names) from the catalog."""
+        self._ids = {}
+        for item in (self.coordinator.data or {}).get(self.entity_description.key, []):
+            name = item["name"]
+            if name in self._ids:
+                # Deux éléments du même nom : on les distingue par leur ID
+                name = f"{name} ({item['id']})"
+            self._ids[name] = item["id"]
+        self._attr_options = list(self._ids)
+        if self._attr_current_option not in self._ids:
+            self._attr_current_option = None
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle a new catalog."""
+        self._update_options()
+        super()._handle_coordinator_update()
+
+    async def async_added_to_hass(self) -> None:
+        """Follow the announcement queue."""
+        await super().async_added_to_hass()
+        self.async_on_remove(self._queue.async_add_listener(self._async_queue_updated))
+
+    @callback
+    def _async_queue_updated(self) -> None:
+        """Clear the option once the selected item is neither playing nor queued."""
+        if self._attr_current_option is None:
+            return
+        key = (self._kind, self._ids.get(self._attr_current_option))
+        if self._queue.current_key == key or self._queue.is_pending(key):
+            return
+        self._attr_current_option = None
+        self.async_write_ha_state()
+
+    async def async_select_option(self, option: str) -> None:
+        """Play the selected item."""
+        if option not in self._ids:
+            raise ServiceValidationError(f"Option invalide: {option}")
+        LOGGER.debug("Lecture de %s (ID: %s)", option, self._ids[option])
+        if await self._play(self._ids[option]) != "failed":
+            self._attr_current_option = option
             self.async_write_ha_state()
-            await self.coordinator.async_request_refresh()
\ No newline at end of file
@@ -1,4 +1,7 @@
 """Sensor platform for OpenKarotz."""
+from datetime import timedelta
+from typing import Any
+
 from homeassistant.components.sensor import (
     SensorEntity,
     SensorDeviceClass,
@@ -9,24 +12,33 @@ from homeassistant.core import HomeAssistant
 from homeassistant.const import (
     PERCENTAGE,
     EntityCategory,
+    UnitOfInformation,
+    UnitOfTime,
 )
 from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.components.webhook import async_generate_url
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
+from .api import KarotzApiClient
 from .const import DOMAIN
 from .coordinator import KarotzCoordinator
 
+# Les capteurs de métriques lisent le client : un relevé par minute suffit
+SCAN_INTERVAL = timedelta(seconds=60)
+
 # --- NOUVEAU : Description des capteurs de diagnostic ---
 # Basés sur les clés de /cgi-bin/status
-DIAGNOSTIC_SENSORS: tuple[tuple[str, str, str, str | None, str | None, str | None], ...] = (
+DIAGNOSTIC_SENSORS: tuple[
+    tuple[str, str, str, str | None, str | None, str | None, str | None], ...
+] = (
     (
         "version",
         "Version Firmware",
         "mdi:chip",
         None,
         None,
+        None,
         EntityCategory.DIAGNOSTIC,
     ),
     (
@@ -35,14 +47,16 @@ DIAGNOSTIC_SENSORS: tuple[tuple[str, str, str, str | None, str | None, str | Non
         "mdi:network-outline",
         None,
         None,
+        None,
         EntityCategory.DIAGNOSTIC,
     ),
     (
         "karotz_free_space",
         "Espace disque",
         "mdi:harddisk",
-        None, # L'API renvoie "149.5M", donc pas un nombre simple
-        None,
+        UnitOfInformation.BYTES, # "149.5M" converti en octets par le modèle
+        SensorDeviceClass.DATA_SIZE,
+        SensorStateClass.MEASUREMENT,
         EntityCategory.DIAGNOSTIC,
     ),
     (
@@ -50,6 +64,7 @@ DIAGNOSTIC_SENSORS: tuple[tuple[str, str, str, str | None, str | None, str | Non
         "Espace disque utilisé",
         "mdi:harddisk",
         PERCENTAGE,
+        None,
         SensorStateClass.MEASUREMENT,
         EntityCategory.DIAGNOSTIC,
     ),
@@ -58,6 +73,7 @@ DIAGNOSTIC_SENSORS: tuple[tuple[str, str, str, str | None, str | None, str | Non
         "Tags RFID",
         "mdi:rfid",
         None,
+        None,
         SensorStateClass.MEASUREMENT,
         EntityCategory.DIAGNOSTIC,
     ),
@@ -66,6 +82,7 @@ DIAGNOSTIC_SENSORS: tuple[tuple[str, str, str, str | None, str | None, str | Non
         "Humeurs",
         "mdi:emoticon-happy-outline",
         None,
+        None,
         SensorStateClass.MEASUREMENT,
         EntityCategory.DIAGNOSTIC,
     ),
@@ -74,12 +91,27 @@ DIAGNOSTIC_SENSORS: tuple[tuple[str, str, str, str | None, str | None, str | Non
         "Sons",
         "mdi:music-note",
         None,
+        None,
         SensorStateClass.MEASUREMENT,
         EntityCategory.DIAGNOSTIC,
     ),
 )
 
 
+# Endpoints CGI suivis par les capteurs de latence et de taux d'erreur
+METRIC_ENDPOINTS: tuple[str, ...] = (
+    "status",
+    "leds",
+    "tts",
+    "sound",
+    "ears",
+    "snapshot_view",
+    "moods",
+    "radio",
+    "playback",
+)
+
+
 async def async_setup_entry(
     hass: HomeAssistant,
     entry: ConfigEntry,
@@ -87,6 +119,7 @@ async def async_setup_entry(
 ) -> None:
     """Set up the sensor platform."""
     coordinator: KarotzCoordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    client: KarotzApiClient = hass.data[DOMAIN][entry.entry_id]["client"]
     
     # Créer la liste des entités
     entities = [
@@ -95,7 +128,7 @@ async def async_setup_entry(
     ]
     
     # Ajouter tous les capteurs de diagnostic
-    for key, name, icon, unit, state_class, category in DIAGNOSTIC_SENSORS:
+    for key, name, icon, unit, device_class, state_class, category in DIAGNOSTIC_SENSORS:
         entities.append(
             KarotzDiagnosticSensor(
                 coordinator,
@@ -104,10 +137,16 @@ async def async_setup_entry(
                 name,
                 icon,
                 unit,
+                device_class,
                 state_class,
                 category,
             )
         )
+
+    # Ajouter les capteurs de latence et de taux d'erreur par endpoint
+    for endpoint in METRIC_ENDPOINTS:
+        entities.append(KarotzLatencySensor(client, entry, endpoint))
+        entities.append(KarotzErrorRateSensor(client, entry, endpoint))
         
     async_add_entities(entities)
 
@@ -159,11 +198,12 @@ class KarotzDiagnosticSensor(CoordinatorEntity[KarotzCoordinator], SensorEntity)
         name: str,
         icon: str,
         unit: str | None,
+        device_class: str | None,
         state_class: str | None,
         category: str | None,
     ) -> None:
         """Initialize the diagnostic sensor."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=frozenset({key}))
         self._entry = entry
         self._key = key
         
@@ -171,6 +211,10 @@ class KarotzDiagnosticSensor(CoordinatorEntity[KarotzCoordinator], SensorEntity)
         self._attr_name = name
         self._attr_icon = icon
         self._attr_native_unit_of_measurement = unit
+        self._attr_device_class = device_class
+        if device_class == SensorDeviceClass.DATA_SIZE:
+            # Affiché en Mio : df -h du Karotz compte en puissances de 1024
+            self._attr_suggested_unit_of_measurement = UnitOfInformation.MEBIBYTES
         self._attr_state_class = state_class
         self._attr_entity_category = category
 
@@ -182,8 +226,92 @@ class KarotzDiagnosticSensor(CoordinatorEntity[KarotzCoordinator], SensorEntity)
         )
 
     @property
-    def native_value(self) -> str | None:
+    def native_value(self) -> str | int | float | None:
         """Return the state of the sensor."""
         if not self.coordinator.data:
             return None
-        return self.coordinator.data.get(self._key)
\ No newline at end of file
+        return getattr(self.coordinator.data, self._key)
+
+
+class KarotzLatencySensor(SensorEntity):
+    """p95 latency of a Karotz cgi-bin endpoint, with p50 and p99 as attributes."""
+
+    _attr_has_entity_name = True
+    _attr_icon = "mdi:timer-outline"
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_suggested_display_precision = 0
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    # Ces capteurs sont désactivés par défaut
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(self, client: KarotzApiClient, entry: ConfigEntry, endpoint: str) -> None:
+        """Initialize the latency sensor."""
+        self._client = client
+        self._entry = entry
+        self._endpoint = endpoint
+
+        self._attr_unique_id = f"{entry.entry_id}_latency_{endpoint}"
+        self._attr_name = f"Latence {endpoint}"
+
+    @property
+    def device_info(self) -> DeviceInfo:
+        """Return device info."""
+        return DeviceInfo(
+            identifiers={(DOMAIN, self._entry.entry_id)},
+        )
+
+    @property
+    def native_value(self) -> float | None:
+        """Return the p95 latency in milliseconds."""
+        if (metrics := self._client.metrics.get(self._endpoint)) is None:
+            return None
+        return metrics.quantile(0.95)
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        """Return the other quantiles and the request counters."""
+        if (metrics := self._client.metrics.get(self._endpoint)) is None:
+            return None
+        return metrics.as_dict()
+
+
+class KarotzErrorRateSensor(SensorEntity):
+    """Share of failed or timed out requests on a Karotz cgi-bin endpoint."""
+
+    _attr_has_entity_name = True
+    _attr_icon = "mdi:alert-circle-outline"
+    _attr_native_unit_of_measurement = PERCENTAGE
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_suggested_display_precision = 1
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    # Ces capteurs sont désactivés par défaut
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(self, client: KarotzApiClient, entry: ConfigEntry, endpoint: str) -> None:
+        """Initialize the error rate sensor."""
+        self._client = client
+        self._entry = entry
+        self._endpoint = endpoint
+
+        self._attr_unique_id = f"{entry.entry_id}_error_rate_{endpoint}"
+        self._attr_name = f"Taux d'erreur {endpoint}"
+
+    @property
+    def device_info(self) -> DeviceInfo:
+        """Return device info."""
+        return DeviceInfo(
+            identifiers={(DOMAIN, self._entry.entry_id)},
+        )
+
+    @property
+    def native_value(self) -> float | None:
+        """Return the error rate in percent."""
+        if (metrics := self._client.metrics.get(self._endpoint)) is None:
+            return None
+        if (error_rate := metrics.error_rate) is None:
+            return None
+        return error_rate * 100
\ No newline at end of file
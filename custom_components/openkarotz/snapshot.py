@@ -0,0 +1,246 @@
+"""Shared camera snapshots for OpenKarotz."""
+from __future__ import annotations
+
+import asyncio
+import struct
+from typing import Any
+
+from homeassistant.components.camera import Image
+from homeassistant.components.camera.img_util import scale_jpeg_camera_image
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+
+from .api import KarotzApiClient
+from .const import (
+    LOGGER,
+    MJPEG_LATENCY_FACTOR,
+    MJPEG_MAX_FRAME_INTERVAL,
+    MJPEG_MAX_RETRY_INTERVAL,
+    MJPEG_MIN_FRAME_INTERVAL,
+    SNAPSHOT_MAX_RESIZED,
+)
+
+# Marqueurs JPEG de début d'image (SOF) qui portent les dimensions
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _jpeg_size(image: bytes) -> tuple[int, int] | None:
+    """Return the (width, height) of a JPEG, read from its header."""
+    offset = 2
+    while offset + 9 <= len(image):
+        if image[offset] != 0xFF:
+            return None
+        marker = image[offset + 1]
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">HH", image[offset + 5 : offset + 9])
+            return width, height
+        (length,) = struct.unpack(">H", image[offset + 2 : offset + 4])
+        offset += 2 + length
+    return None
+
+
+def _scale(image: bytes, width: int | None, height: int | None) -> bytes:
+    """Scale a JPEG down to fit width and/or height (runs in the executor).
+
+    The frontend usually asks for a single dimension; the other one is taken
+    from the aspect ratio. The full image is returned if the header is unreadable.
+    """
+    if width is None or height is None:
+        if (size := _jpeg_size(image)) is None or not all(size):
+            return image
+        if width is None:
+            width = round(height * size[0] / size[1])
+        else:
+            height = round(width * size[1] / size[0])
+    return scale_jpeg_camera_image(Image("image/jpeg", image), width, height)
+
+
+class KarotzSnapshotCache:
+    """Share Karotz camera captures between all viewers.
+
+    Concurrent callers wait on a single in-flight capture, and the last JPEG is
+    served from memory for ttl seconds, so N dashboards cost one run of the
+    snapshot_view CGI per TTL window. MJPEG viewers subscribe to a single
+    capture loop that runs only while someone is watching. Resized variants
+    are produced in the executor and kept until the next capture.
+    """
+
+    def __init__(self, hass: HomeAssistant, client: KarotzApiClient, ttl: float) -> None:
+        """Initialize the snapshot cache."""
+        self._hass = hass
+        self._client = client
+        self._ttl = ttl
+        self._image: bytes | None = None
+        self._captured_at = 0.0
+        self._capture: asyncio.Task[bytes | None] | None = None
+
+        # Vignettes de la dernière capture, par (largeur, hauteur)
+        self._resized: dict[tuple[int | None, int | None], bytes] = {}
+        self._resized_source: bytes | None = None
+
+        # Flux MJPEG
+        self._viewers: set[asyncio.Queue[bytes]] = set()
+        self._stream_task: asyncio.Task | None = None
+        self._latency: float | None = None
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @property
+    def client(self) -> KarotzApiClient:
+        """Return the API client used for captures."""
+        return self._client
+
+    async def async_get_image(
+        self,
+        max_age: float | None = None,
+        width: int | None = None,
+        height: int | None = None,
+    ) -> bytes | None:
+        """Return a JPEG at most max_age (default: the TTL) seconds old.
+
+        When width or height is given, the image is scaled down to fit.
+        """
+        image = await self._async_get_full_image(max_age)
+        if image is None or (width is None and height is None):
+            return image
+        return await self._async_resize(image, width, height)
+
+    async def _async_get_full_image(self, max_age: float | None) -> bytes | None:
+        """Return a full-size JPEG, sharing or starting a capture if needed."""
+        if max_age is None:
+            max_age = self._ttl
+        if (
+            self._image is not None
+            and self._hass.loop.time() - self._captured_at < max_age
+        ):
+            self.hits += 1
+            return self._image
+
+        if self._capture is None:
+            self.misses += 1
+            self._capture = self._hass.async_create_task(
+                self._async_capture(), "openkarotz snapshot"
+            )
+        else:
+            self.coalesced += 1
+
+        # shield : un spectateur qui part n'annule pas la capture des autres
+        return await asyncio.shield(self._capture)
+
+    async def _async_capture(self) -> bytes | None:
+        """Run one device capture and keep the result."""
+        try:
+            image = await self._client.async_get_snapshot()
+            if image is not None:
+                self._image = image
+                self._captured_at = self._hass.loop.time()
+            return image
+        finally:
+            self._capture = None
+
+    async def _async_resize(
+        self, image: bytes, width: int | None, height: int | None
+    ) -> bytes:
+        """Scale a capture down, off the event loop, and cache the result."""
+        if self._resized_source is not image:
+            # Nouvelle capture : les anciennes vignettes ne sont plus valables
+            self._resized.clear()
+            self._resized_source = image
+
+        size = (width, height)
+        if (resized := self._resized.get(size)) is not None:
+            return resized
+
+        resized = await self._hass.async_add_executor_job(_scale, image, width, height)
+        if self._resized_source is image:
+            if len(self._resized) >= SNAPSHOT_MAX_RESIZED:
+                self._resized.pop(next(iter(self._resized)))
+            self._resized[size] = resized
+        return resized
+
+    @callback
+    def async_subscribe(self) -> tuple[asyncio.Queue[bytes], CALLBACK_TYPE]:
+        """Subscribe an MJPEG viewer to the capture loop."""
+        # Taille 1 : un spectateur lent ne reçoit que l'image la plus récente
+        frames: asyncio.Queue[bytes] = asyncio.Queue(maxsize=1)
+        self._viewers.add(frames)
+        if self._stream_task is None:
+            self._stream_task = self._hass.async_create_background_task(
+                self._async_stream_loop(), "openkarotz mjpeg"
+            )
+
+        @callback
+        def unsubscribe() -> None:
+            self._viewers.discard(frames)
+
+        return frames, unsubscribe
+
+    async def _async_stream_loop(self) -> None:
+        """Capture frames and fan them out while at least one viewer watches."""
+        loop = self._hass.loop
+        LOGGER.debug("Démarrage du flux MJPEG")
+        failures = 0
+        try:
+            while self._viewers:
+                started = loop.time()
+                image = await self.async_get_image(max_age=0)
+                latency = loop.time() - started
+
+                if image is None:
+                    # Lapin injoignable ou caméra en panne : on espace les essais
+                    failures += 1
+                    await asyncio.sleep(
+                        min(
+                            MJPEG_MAX_FRAME_INTERVAL * 2 ** (failures - 1),
+                            MJPEG_MAX_RETRY_INTERVAL,
+                        )
+                    )
+                    continue
+                failures = 0
+
+                for frames in self._viewers:
+                    if frames.full():
+                        frames.get_nowait()
+                    frames.put_nowait(image)
+
+                # Laisser le CGI respirer : la cadence suit la latence lissée
+                self._latency = (
+                    latency
+                    if self._latency is None
+                    else 0.7 * self._latency + 0.3 * latency
+                )
+                await asyncio.sleep(max(self.frame_interval - latency, 0))
+        finally:
+            self._stream_task = None
+            LOGGER.debug("Arrêt du flux MJPEG, plus aucun spectateur")
+
+    @property
+    def frame_interval(self) -> float:
+        """Return the current MJPEG frame interval, in seconds."""
+        if self._latency is None:
+            return MJPEG_MIN_FRAME_INTERVAL
+        return min(
+            max(self._latency * MJPEG_LATENCY_FACTOR, MJPEG_MIN_FRAME_INTERVAL),
+            MJPEG_MAX_FRAME_INTERVAL,
+        )
+
+    async def async_shutdown(self) -> None:
+        """Stop the capture loop."""
+        self._viewers.clear()
+        if self._stream_task is not None:
+            self._stream_task.cancel()
+            self._stream_task = None
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return cache statistics."""
+        return {
+            "ttl": self._ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "cached_bytes": len(self._image) if self._image else 0,
+            "resized_sizes": [list(size) for size in self._resized],
+            "mjpeg_viewers": len(self._viewers),
+            "mjpeg_frame_interval": round(self.frame_interval, 2),
+        }
@@ -0,0 +1,373 @@
+"""Text-to-speech pipeline for OpenKarotz."""
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from collections.abc import Iterable
+import re
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .api import KarotzApiClient
+from .const import (
+    DOMAIN,
+    LOGGER,
+    TTS_CACHE_MAX_ENTRIES,
+    TTS_CACHE_MIN_FREE_SPACE,
+    TTS_CACHE_MIN_USES,
+    TTS_CACHE_SAVE_DELAY,
+    TTS_CACHE_STORAGE_VERSION,
+    TTS_CHUNK_MAX_CHARS,
+    TTS_FIRST_CHUNK_MAX_CHARS,
+    TTS_PREWARM_PAUSE,
+)
+from .coordinator import KarotzCoordinator
+from .playback import KarotzPlaybackTracker
+
+# Fin de phrase : . ! ? ou … suivi d'un espace puis d'une majuscule (« : » et
+# « ; » précédés d'un espace, fréquents en français, ne coupent pas)
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+(?=(?:[«\"“(]\s*)?[A-ZÀ-ÖØ-ÞŒ])")
+
+# Abréviations suivies d'un point qui ne terminent pas une phrase
+_ABBREVIATIONS = frozenset(
+    {"m", "mm", "mme", "mmes", "mlle", "mlles", "dr", "pr", "mr", "st", "ste", "vs"}
+)
+
+
+def _sentences(text: str) -> list[str]:
+    """Split text into sentences, without cutting after abbreviations."""
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        word = text[start : match.start()].rsplit(None, 1)[-1]
+        if word.endswith(".") and (
+            word[:-1].lstrip("(«\"“").lower() in _ABBREVIATIONS
+            # Initiale d'un prénom : « J. Dupont »
+            or (len(word) == 2 and word[0].isupper())
+        ):
+            continue
+        sentences.append(text[start : match.start()])
+        start = match.end()
+    sentences.append(text[start:])
+    return [sentence for sentence in sentences if sentence]
+
+
+def _split_long(sentence: str, max_chars: int) -> list[str]:
+    """Split a sentence longer than max_chars at commas, then at spaces."""
+    parts = []
+    while len(sentence) > max_chars:
+        cut = sentence.rfind(", ", 0, max_chars)
+        if cut > 0:
+            cut += 1  # garder la virgule avec le début
+        else:
+            cut = sentence.rfind(" ", 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        parts.append(sentence[:cut].strip())
+        sentence = sentence[cut:].strip()
+    if sentence:
+        parts.append(sentence)
+    return parts
+
+
+def split_sentences(
+    text: str,
+    first_max: int = TTS_FIRST_CHUNK_MAX_CHARS,
+    max_chars: int = TTS_CHUNK_MAX_CHARS,
+) -> list[str]:
+    """Split text into TTS chunks at sentence boundaries.
+
+    The first chunk is a single short sentence (at most first_max characters)
+    so the rabbit starts speaking quickly; following sentences are packed
+    together up to max_chars to limit the number of tts calls.
+    """
+    sentences = _sentences(text.strip())
+    if not sentences:
+        return []
+
+    chunks = _split_long(sentences[0], first_max)
+    current = ""
+    for sentence in sentences[1:]:
+        for part in _split_long(sentence, max_chars):
+            if current and len(current) + 1 + len(part) > max_chars:
+                chunks.append(current)
+                current = part
+            else:
+                current = f"{current} {part}" if current else part
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class KarotzTtsCache:
+    """LRU index of the phrases likely warm in the rabbit's TTS cache.
+
+    The rabbit only says whether its cache is empty (tts_cache_size), not what
+    it holds, so Home Assistant tracks which (text, voice) pairs it sent with
+    nocache=0. A phrase is cached from its TTS_CACHE_MIN_USES-th use on, so
+    one-off messages do not fill the rabbit's flash.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, coordinator: KarotzCoordinator, entry_id: str
+    ) -> None:
+        """Initialize the cache index."""
+        self._coordinator = coordinator
+        self._store: Store[list[list[Any]]] = Store(
+            hass, TTS_CACHE_STORAGE_VERSION, f"{DOMAIN}.tts_cache.{entry_id}"
+        )
+        # (voix, texte) -> [utilisations, en cache sur le lapin]
+        self._index: OrderedDict[tuple[str, str], list[Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def async_load(self) -> None:
+        """Restore the index from disk."""
+        for voice, text, uses, warm in await self._store.async_load() or []:
+            self._index[(voice, text)] = [uses, warm]
+
+    @callback
+    def _async_save(self) -> None:
+        """Schedule a write of the index."""
+        self._store.async_delay_save(
+            lambda: [[voice, text, *entry] for (voice, text), entry in self._index.items()],
+            TTS_CACHE_SAVE_DELAY,
+        )
+
+    @callback
+    def _async_check_device(self) -> bool:
+        """Forget warm entries if the rabbit's cache was emptied.
+
+        Return False when the rabbit is too short on space for new entries.
+        """
+        status = self._coordinator.data
+        if status is None:
+            return True
+        if status.tts_cache_size == 0 and any(entry[1] for entry in self._index.values()):
+            LOGGER.debug("Cache TTS du lapin vidé, index remis à zéro")
+            for entry in self._index.values():
+                entry[1] = False
+        return (
+            status.karotz_free_space is None
+            or status.karotz_free_space >= TTS_CACHE_MIN_FREE_SPACE
+        )
+
+    @callback
+    def async_use(self, text: str, voice: str, prewarm: bool = False) -> bool:
+        """Record a use of a phrase; return True to send it with nocache=0."""
+        has_space = self._async_check_device()
+        key = (voice, text)
+        entry = self._index.pop(key, None) or [0, False]
+        entry[0] += 1
+        self._index[key] = entry
+        while len(self._index) > TTS_CACHE_MAX_ENTRIES:
+            self._index.popitem(last=False)
+        self._async_save()
+
+        if entry[1]:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return has_space and (prewarm or entry[0] >= TTS_CACHE_MIN_USES)
+
+    @callback
+    def async_mark_warm(self, text: str, voice: str) -> None:
+        """Record that the rabbit now holds this phrase."""
+        if (entry := self._index.get((voice, text))) is not None and not entry[1]:
+            entry[1] = True
+            self._async_save()
+
+    def is_warm(self, text: str, voice: str) -> bool:
+        """Return True if the phrase is likely in the rabbit's cache."""
+        entry = self._index.get((voice, text))
+        return entry is not None and entry[1]
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return cache statistics."""
+        return {
+            "entries": len(self._index),
+            "warm": sum(1 for entry in self._index.values() if entry[1]),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class KarotzSpeechPipeline:
+    """Speak long texts chunk by chunk, starting with the first sentence.
+
+    The first chunk is sent right away; each following chunk is sent as soon
+    as the playback tracker reports the previous one finished. The time from
+    the request to the first accepted tts call is kept as time-to-first-audio.
+    With a cache, frequent chunks are sent with nocache=0 and can be
+    pre-warmed (synthesized muted) while the rabbit is idle.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        client: KarotzApiClient,
+        tracker: KarotzPlaybackTracker,
+        cache: KarotzTtsCache | None = None,
+    ) -> None:
+        """Initialize the pipeline."""
+        self._hass = hass
+        self._client = client
+        self._tracker = tracker
+        self._cache = cache
+        self._task: asyncio.Task | None = None
+        self._prewarm_task: asyncio.Task | None = None
+        self.last_time_to_first_audio: float | None = None
+        self.last_chunks = 0
+
+    @property
+    def speaking(self) -> bool:
+        """Return True while chunks of a text remain to be sent."""
+        return self._task is not None
+
+    async def _async_say(self, chunk: str, voice: str, mute: bool = False) -> bool:
+        """Send one chunk, through the rabbit's cache when worth it.
+
+        A muted chunk is only sent to be cached: if the cache refuses it (the
+        rabbit is out of space), nothing is sent and False is returned.
+        """
+        cache = self._cache is not None and self._cache.async_use(chunk, voice, prewarm=mute)
+        if mute and not cache:
+            # Synthèse muette sans mise en cache : requête coûteuse et inutile
+            LOGGER.debug("Cache TTS plein, pré-chauffage de « %s » ignoré", chunk)
+            return False
+        if not await self._client.async_tts(chunk, voice, cache=cache, mute=mute):
+            return False
+        if cache:
+            self._cache.async_mark_warm(chunk, voice)
+        return True
+
+    async def async_speak(self, text: str, voice: str = "claire") -> bool:
+        """Speak text; return once the first chunk has been accepted."""
+        self.async_cancel()
+        chunks = split_sentences(text)
+        if not chunks:
+            return False
+
+        started = self._hass.loop.time()
+        if not await self._async_say(chunks[0], voice):
+            return False
+        self.last_time_to_first_audio = self._hass.loop.time() - started
+        self.last_chunks = len(chunks)
+        LOGGER.debug(
+            "TTS : premier morceau accepté en %.2f s (%d morceau(x))",
+            self.last_time_to_first_audio,
+            len(chunks),
+        )
+        self._tracker.async_start(playing=True)
+
+        if len(chunks) > 1:
+            self._task = self._hass.async_create_background_task(
+                self._async_speak_rest(chunks[1:], voice), "openkarotz tts"
+            )
+        return True
+
+    async def async_prepare(self, text: str, voice: str = "claire") -> bool:
+        """Synthesize the first chunk of text muted, so speaking it is instant.
+
+        Return False when there is no cache to keep it in.
+        """
+        if self._cache is None or not (chunks := split_sentences(text)):
+            return False
+        if self._cache.is_warm(chunks[0], voice):
+            return True
+        return await self._async_say(chunks[0], voice, mute=True)
+
+    async def _async_speak_rest(self, chunks: list[str], voice: str) -> None:
+        """Send the remaining chunks back to back."""
+        try:
+            for index, chunk in enumerate(chunks):
+                await self._tracker.async_wait_ended()
+                try:
+                    accepted = await self._async_say(chunk, voice)
+                except ConnectionError as err:
+                    LOGGER.warning("TTS interrompu, lapin injoignable: %s", err)
+                    accepted = False
+                else:
+                    if not accepted:
+                        LOGGER.warning("TTS interrompu, morceau refusé: %s", chunk)
+                if not accepted:
+                    # Plus rien ne parle : la fin de lecture doit être signalée
+                    # (la file d'annonces l'ignorait tant que speaking était vrai)
+                    self._task = None
+                    self._tracker.async_stop()
+                    break
+                # Plus de morceau après celui-ci : la fin de lecture est la vraie fin
+                if index == len(chunks) - 1:
+                    self._task = None
+                self._tracker.async_start(playing=True)
+        finally:
+            if self._task is asyncio.current_task():
+                self._task = None
+
+    @callback
+    def async_cancel(self) -> None:
+        """Drop the chunks not sent yet."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    @callback
+    def async_prewarm(self, phrases: Iterable[str], voice: str = "claire") -> None:
+        """Synthesize phrases into the rabbit's cache in the background."""
+        if self._cache is None:
+            LOGGER.warning("Cache TTS désactivé, pré-chauffage ignoré")
+            return
+        # Les morceaux, pas les phrases entières : c'est ce que async_speak envoie
+        chunks = list(
+            dict.fromkeys(
+                chunk
+                for phrase in phrases
+                for chunk in split_sentences(phrase)
+                if not self._cache.is_warm(chunk, voice)
+            )
+        )
+        if not chunks:
+            return
+        if self._prewarm_task is not None:
+            self._prewarm_task.cancel()
+        self._prewarm_task = self._hass.async_create_background_task(
+            self._async_prewarm(chunks, voice), "openkarotz tts prewarm"
+        )
+
+    async def _async_prewarm(self, chunks: list[str], voice: str) -> None:
+        """Synthesize chunks one by one, only while the rabbit is idle."""
+        warmed = 0
+        try:
+            for chunk in chunks:
+                # Jamais pendant une lecture ou une annonce
+                while self._tracker.playing or self.speaking:
+                    await self._tracker.async_wait_ended()
+                    await asyncio.sleep(TTS_PREWARM_PAUSE)
+                if not await self._async_say(chunk, voice, mute=True):
+                    LOGGER.debug("Pré-chauffage interrompu sur: %s", chunk)
+                    break
+                warmed += 1
+                await asyncio.sleep(TTS_PREWARM_PAUSE)
+        finally:
+            LOGGER.debug("Pré-chauffage TTS : %d/%d morceau(x)", warmed, len(chunks))
+            if self._prewarm_task is asyncio.current_task():
+                self._prewarm_task = None
+
+    async def async_shutdown(self) -> None:
+        """Stop the pipeline."""
+        self.async_cancel()
+        if self._prewarm_task is not None:
+            self._prewarm_task.cancel()
+            self._prewarm_task = None
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return pipeline statistics."""
+        return {
+            "speaking": self.speaking,
+            "prewarming": self._prewarm_task is not None,
+            "last_chunks": self.last_chunks,
+            "last_time_to_first_audio": self.last_time_to_first_audio,
+            "cache": self._cache.as_dict() if self._cache is not None else None,
+        }
@@ -40,7 +40,7 @@ class KarotzSleepSwitch(CoordinatorEntity[KarotzCoordinator], SwitchEntity):
         entry: ConfigEntry
     ):
         """Initialize the switch."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=frozenset({"sleep"}))
         self._client = client
         self._entry = entry
         self._attr_unique_id = f"{entry.entry_id}_sleep_switch"
@@ -58,23 +58,23 @@ class KarotzSleepSwitch(CoordinatorEntity[KarotzCoordinator], SwitchEntity):
         if not self.coordinator.data:
             return False
         # "on" (endormi) si "sleep" == "1"
-        return self.coordinator.data.get("sleep") == "1"
+        return self.coordinator.data.sleep
 
     async def async_turn_on(self, **kwargs: Any) -> None:
         """Turn the switch on (put Karotz to sleep)."""
         if await self._client.async_sleep():
-            self._update_local_data("1")
+            self._update_local_data(True)
 
     async def async_turn_off(self, **kwargs: Any) -> None:
         """Turn the switch off (wake up Karotz)."""
         if await self._client.async_wakeup():
-            self._update_local_data("0")
+            self._update_local_data(False)
 
     @callback
-    def _update_local_data(self, sleep_state: str) -> None:
+    def _update_local_data(self, sleep_state: bool) -> None:
         """Optimistically update the coordinator's data and HA state."""
         if self.coordinator.data:
-            self.coordinator.data["sleep"] = sleep_state
+            self.coordinator.data.sleep = sleep_state
         self.async_write_state()
         # Demande un rafraîchissement pour confirmer l'état.
         self.hass.loop.create_task(self.coordinator.async_request_refresh())
\ No newline at end of file